@@ -0,0 +1,110 @@
+"""Address normalisation and de-duplication.
+
+Checkout identifies a saved address by addr_hash, a SHA-256 of the
+normalised street and city (Unicode NFKC, case-folded, punctuation and
+repeated whitespace removed, a few street-type abbreviations spelled
+out). A unique (user_id, addr_hash) index makes the lookup one index
+probe however many addresses the user has, and stops "12 Main Rd" and
+"12, main road " from becoming two rows.
+
+Rows saved before this have no hash. merge_duplicates() hashes them,
+repoints orders from duplicates to one surviving row per user and key,
+and deletes the rest:
+
+    python addresses.py --merge
+"""
+import hashlib
+import re
+import unicodedata
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Address, Order, OrderArchive
+
+MERGE_BATCH_USERS = 500
+
+_ABBREVIATIONS = {'rd': 'road', 'ave': 'avenue', 'ln': 'lane', 'blvd': 'boulevard',
+                  'hwy': 'highway', 'apt': 'apartment', 'opp': 'opposite'}
+_PUNCTUATION = re.compile(r"[^\w\s/-]+")
+
+
+def normalize(text):
+    words = _PUNCTUATION.sub(' ', unicodedata.normalize('NFKC', text or '').casefold()).split()
+    return ' '.join(_ABBREVIATIONS.get(w, w) for w in words)
+
+
+def address_hash(street, city):
+    return hashlib.sha256(f'{normalize(street)}|{normalize(city)}'.encode()).hexdigest()
+
+
+def resolve_address(user_id, street, city, **fields):
+    """The user's saved address matching street/city, created if new (flushed, has an id)."""
+    key = address_hash(street, city)
+    address = Address.query.filter_by(user_id=user_id, addr_hash=key).first()
+    if address is not None:
+        return address
+    address = Address(user_id=user_id, street=street, city=city, addr_hash=key, **fields)
+    try:
+        # savepoint, so a concurrent checkout adding the same address does not undo ours
+        with db.session.begin_nested():
+            db.session.add(address)
+    except IntegrityError:
+        address = Address.query.filter_by(user_id=user_id, addr_hash=key).one()
+    return address
+
+
+def _merge_users(user_ids):
+    """Hash and de-duplicate the addresses of some users; returns rows removed."""
+    rows = db.session.execute(
+        select(Address.id, Address.user_id, Address.street, Address.city, Address.addr_hash)
+        .where(Address.user_id.in_(user_ids)).order_by(Address.id)
+    ).all()
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.user_id, address_hash(row.street, row.city)), []).append(row)
+    removed = 0
+    for (user_id, key), group in groups.items():
+        # keep the row already carrying the key (unique index), else the oldest
+        keep = next((r for r in group if r.addr_hash == key), group[0])
+        duplicates = [r.id for r in group if r.id != keep.id]
+        if duplicates:
+            for model in (Order, OrderArchive):
+                db.session.execute(update(model).where(model.address_id.in_(duplicates))
+                                   .values(address_id=keep.id))
+            db.session.execute(delete(Address).where(Address.id.in_(duplicates)))
+            removed += len(duplicates)
+        if keep.addr_hash != key:
+            db.session.execute(update(Address).where(Address.id == keep.id).values(addr_hash=key))
+    db.session.commit()
+    return removed
+
+
+def merge_duplicates(batch_users=MERGE_BATCH_USERS):
+    """Hash every address and merge duplicates, a batch of users per transaction."""
+    removed = 0
+    last_user = 0
+    while True:
+        user_ids = db.session.execute(
+            select(Address.user_id).where(Address.user_id > last_user)
+            .group_by(Address.user_id).order_by(Address.user_id).limit(batch_users)
+        ).scalars().all()
+        if not user_ids:
+            return removed
+        removed += _merge_users(user_ids)
+        last_user = user_ids[-1]
+        print(f'Merged addresses up to user {last_user}: {removed} duplicates removed')
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Address de-duplication')
+    parser.add_argument('--merge', action='store_true', help='hash existing addresses and merge duplicates')
+    args = parser.parse_args()
+    if not args.merge:
+        parser.error('nothing to do; pass --merge')
+    with app.app_context():
+        print(f'{merge_duplicates()} duplicate addresses removed')
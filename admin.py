@@ -0,0 +1,406 @@
+"""Admin area: dashboard, prescription queue, orders, reports and products."""
+from datetime import datetime, date, timedelta
+
+from flask import Blueprint, Response, abort, current_app, render_template, jsonify, request, session, flash
+from flask import redirect, url_for
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from admin_actions import BulkActionError, change_order_statuses, change_prescription_statuses
+from analytics import sales_report
+from archive import move_archived_files
+from auth import admin_required, authenticate, login_retry_after
+from catalog import invalidate_catalog
+from config import pool_metrics, read_replica
+from dashboard import get_dashboard_counts, invalidate_dashboard_counts
+from models import db, Admin, Order, Prescription, Product
+from pagination import keyset_page
+from prescription_queue import QueueError, parse_filters, queue_page, claim_next
+from profiler import render_metrics
+from search import index_product, unindex_product
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+ADMIN_ORDERS_PAGE_SIZE = 50
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def admin_login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        retry_after = login_retry_after(username, scope='admin')
+        if retry_after:
+            flash(f'Too many login attempts. Please try again in {int(retry_after) + 1} seconds.', 'error')
+            return render_template('admin/login.html'), 429
+        admin = Admin.query.filter_by(username=username).first()
+        if not admin or not authenticate(admin, password):
+            flash('Invalid admin credentials', 'error')
+            return render_template('admin/login.html')
+        db.session.commit()
+        session['admin_id'] = admin.id
+        session['admin_name'] = admin.name or admin.username
+        flash('Admin logged in', 'success')
+        next_url = request.args.get('next') or url_for('.admin_dashboard')
+        return redirect(next_url)
+    return render_template('admin/login.html')
+
+
+@bp.route('/logout')
+def admin_logout():
+    session.pop('admin_id', None)
+    session.pop('admin_name', None)
+    return redirect(url_for('.admin_login'))
+
+
+@bp.route('')
+@admin_required
+@read_replica
+def admin_dashboard():
+    # dashboard counts (one aggregate query, cached briefly)
+    return render_template('admin/dashboard.html', **get_dashboard_counts())
+
+
+@bp.route('/db-pool')
+@admin_required
+def admin_db_pool():
+    # connection pool usage and checkout wait times, per database
+    return jsonify(pool_metrics(db.engines))
+
+
+@bp.route('/metrics')
+@admin_required
+def admin_metrics():
+    # Prometheus text format; request histograms need PROFILE_REQUESTS
+    return Response(render_metrics(db.engines, current_app.extensions.get('startup_seconds')),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/account', methods=['GET', 'POST'])
+@admin_required
+def admin_account():
+    from models import Admin
+    admin = Admin.query.get(session.get('admin_id'))
+    if not admin:
+        flash('Admin not found', 'error')
+        return redirect(url_for('.admin_dashboard'))
+
+    if request.method == 'POST':
+        # Form fields
+        current_password = request.form.get('current_password')
+        new_username = request.form.get('new_username')
+        new_password = request.form.get('new_password')
+        confirm_password = request.form.get('confirm_password')
+
+        # Verify current password
+        if not admin.check_password(current_password):
+            flash('Current password is incorrect.', 'error')
+            return render_template('admin/account.html', admin=admin)
+
+        changed = False
+        # Update username if provided
+        if new_username and new_username != admin.username:
+            # ensure uniqueness
+            exists = Admin.query.filter_by(username=new_username).first()
+            if exists and exists.id != admin.id:
+                flash('Username already taken by another admin.', 'error')
+                return render_template('admin/account.html', admin=admin)
+            admin.username = new_username
+            changed = True
+
+        # Update password if provided (and matches confirm)
+        if new_password:
+            if new_password != confirm_password:
+                flash('New password and confirmation do not match.', 'error')
+                return render_template('admin/account.html', admin=admin)
+            admin.set_password(new_password)
+            changed = True
+
+        if changed:
+            db.session.add(admin)
+            db.session.commit()
+            # update session name if changed
+            session['admin_name'] = admin.name or admin.username
+            flash('Account updated successfully.', 'success')
+            return redirect(url_for('.admin_dashboard'))
+
+        flash('No changes made.', 'info')
+
+    return render_template('admin/account.html', admin=admin)
+
+
+@bp.route('/prescriptions')
+@admin_required
+@read_replica
+def admin_prescriptions():
+    # the work queue (pending + processing by default), oldest first, one page at a time
+    try:
+        filters = parse_filters(request.args)
+        prescs, next_cursor = queue_page(filters, request.args.get('cursor'))
+    except ValueError as e:
+        flash(str(e) if isinstance(e, QueueError) else 'Invalid page link', 'error')
+        return redirect(url_for('.admin_prescriptions'))
+    page_args = {k: v for k, v in request.args.items() if k != 'cursor'}
+    return render_template('admin/prescriptions.html', prescriptions=prescs, next_cursor=next_cursor,
+                           filters=page_args, is_first_page=not request.args.get('cursor'))
+
+
+def queue_entry(prescription):
+    data = prescription.to_dict()
+    data['customer'] = prescription.user.name if prescription.user else None
+    return data
+
+
+@bp.route('/prescriptions/queue')
+@admin_required
+@read_replica
+def admin_prescription_queue():
+    """Queue page as JSON: ?status=pending,processing&from=&to=&doctor=&cursor="""
+    try:
+        prescs, next_cursor = queue_page(parse_filters(request.args), request.args.get('cursor'))
+    except QueueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'prescriptions': [queue_entry(p) for p in prescs], 'next_cursor': next_cursor})
+
+
+@bp.route('/prescriptions/claim', methods=['POST'])
+@admin_required
+def admin_claim_prescriptions():
+    """{"count": 5} -> the oldest pending prescriptions, now processing and ours."""
+    data = request.get_json(silent=True) or {}
+    try:
+        claimed = claim_next(session['admin_id'], data.get('count', 1))
+    except QueueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print('Prescription claim failed:', str(e))
+        return jsonify({'error': 'Could not claim prescriptions'}), 500
+    if claimed:
+        invalidate_dashboard_counts()
+    return jsonify({'claimed': [queue_entry(p) for p in claimed]})
+
+
+@bp.route('/prescriptions/<int:pid>/status', methods=['POST'])
+@admin_required
+def admin_change_prescription_status(pid):
+    new_status = request.form.get('status')
+    if new_status:
+        try:
+            results = change_prescription_statuses([pid], new_status)
+        except BulkActionError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('.admin_prescriptions'))
+        if not results[0]['ok']:
+            abort(404)
+        db.session.commit()
+        invalidate_dashboard_counts()
+        flash('Prescription status updated', 'success')
+    return redirect(url_for('.admin_prescriptions'))
+
+
+@bp.route('/prescriptions/bulk-status', methods=['POST'])
+@admin_required
+def admin_bulk_prescription_status():
+    """{"ids": [...], "status": "ready"} -> one UPDATE, with a result per id."""
+    data = request.get_json(silent=True) or {}
+    try:
+        results = change_prescription_statuses(data.get('ids'), data.get('status'))
+        db.session.commit()
+    except BulkActionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print('Bulk prescription status failed:', str(e))
+        return jsonify({'error': 'Could not update prescriptions'}), 500
+    invalidate_dashboard_counts()
+    return jsonify({'updated': sum(1 for r in results if r.get('previous')), 'results': results})
+
+
+@bp.route('/orders')
+@admin_required
+@read_replica
+def admin_orders():
+    # one page of orders plus two batched loads for items and addresses
+    query = Order.query.options(selectinload(Order.items), selectinload(Order.address))
+    try:
+        orders, next_cursor = keyset_page(query, [Order.created_at, Order.id],
+                                          request.args.get('cursor'), ADMIN_ORDERS_PAGE_SIZE)
+    except ValueError:
+        flash('Invalid page link', 'error')
+        return redirect(url_for('.admin_orders'))
+    return render_template('admin/orders.html', orders=orders, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
+
+
+@bp.route('/orders/<int:oid>/status', methods=['POST'])
+@admin_required
+def admin_change_order_status(oid):
+    new_status = request.form.get('status')
+    if new_status:
+        try:
+            results, archived, files = change_order_statuses([oid], new_status)
+        except BulkActionError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('.admin_orders'))
+        if not results[0]['ok']:
+            abort(404)
+        db.session.commit()
+        move_archived_files(files)
+        invalidate_dashboard_counts()
+        if archived:
+            flash('Order marked as delivered. Prescription has been archived.', 'success')
+        else:
+            flash('Order status updated', 'success')
+    return redirect(url_for('.admin_orders'))
+
+
+@bp.route('/orders/bulk-status', methods=['POST'])
+@admin_required
+def admin_bulk_order_status():
+    """{"ids": [...], "status": "delivered"} -> one UPDATE, with a result per id."""
+    data = request.get_json(silent=True) or {}
+    try:
+        results, archived, files = change_order_statuses(data.get('ids'), data.get('status'))
+        db.session.commit()
+    except BulkActionError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        print('Bulk order status failed:', str(e))
+        return jsonify({'error': 'Could not update orders'}), 500
+    move_archived_files(files)
+    invalidate_dashboard_counts()
+    return jsonify({'updated': sum(1 for r in results if r.get('previous')),
+                    'archived_prescriptions': archived, 'results': results})
+
+
+@bp.route('/orders/<int:oid>/prescription', methods=['POST'])
+@admin_required
+def admin_link_order_prescription(oid):
+    """Link an order to the prescription it fills: {"prescription_id": 12} (null unlinks)."""
+    data = request.get_json(silent=True) or {}
+    order = Order.query.get_or_404(oid)
+    pid = data.get('prescription_id')
+    if pid is not None:
+        try:
+            pid = int(pid)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'prescription_id must be a whole number'}), 400
+        prescription = db.session.get(Prescription, pid)
+        if prescription is None:
+            return jsonify({'error': 'Prescription not found'}), 404
+        if prescription.user_id != order.user_id:
+            return jsonify({'error': 'Prescription belongs to a different customer'}), 400
+    order.prescription_id = pid
+    db.session.commit()
+    return jsonify(order.to_dict())
+
+
+@bp.route('/reports')
+@admin_required
+@read_replica
+def admin_reports():
+    # reads only the daily rollups (see analytics.py), never orders
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        flash('Invalid date range', 'error')
+        return redirect(url_for('.admin_reports'))
+    if start > end:
+        start, end = end, start
+    return render_template('admin/reports.html', start=start, end=end, **sales_report(start, end))
+
+
+@bp.route('/products')
+@admin_required
+@read_replica
+def admin_products():
+    products = Product.query.order_by(Product.name).all()
+    return render_template('admin/products.html', products=products)
+
+
+@bp.route('/products/new', methods=['POST'])
+@admin_required
+def admin_create_product():
+    name = request.form.get('name')
+    category = request.form.get('category') or 'other'
+    # parse numeric inputs more robustly (accept decimals in the form)
+    def _parse_int_field(val, default=0):
+        try:
+            if val is None or str(val).strip() == '':
+                return default
+            # allow decimals like '12.50' but store as whole units
+            return int(round(float(val)))
+        except Exception:
+            return default
+
+    price = _parse_int_field(request.form.get('price'), 0)
+    stock = _parse_int_field(request.form.get('stock'), 0)
+    if not name:
+        flash('Product name required', 'error')
+        return redirect(url_for('.admin_products'))
+    p = Product(name=name, category=category, price=price, stock=stock, is_active=True)
+    db.session.add(p)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # product names are unique (checkout resolves carts by name)
+        db.session.rollback()
+        flash(f'A product named {name!r} already exists', 'error')
+        return redirect(url_for('.admin_products'))
+    invalidate_dashboard_counts()
+    invalidate_catalog()
+    index_product(p)
+    flash('Product created', 'success')
+    return redirect(url_for('.admin_products'))
+
+
+@bp.route('/products/<int:pid>/update', methods=['POST'])
+@admin_required
+def admin_update_product(pid):
+    p = Product.query.get_or_404(pid)
+    p.name = request.form.get('name') or p.name
+    p.category = request.form.get('category') or p.category
+    # robust parsing: preserve existing values when input is empty, accept decimal inputs
+    def _parse_update_int_field(val, current):
+        try:
+            if val is None or str(val).strip() == '':
+                return current
+            return int(round(float(val)))
+        except Exception:
+            return current
+
+    p.price = _parse_update_int_field(request.form.get('price'), p.price)
+    p.stock = _parse_update_int_field(request.form.get('stock'), p.stock)
+    # checkbox returns '1' when checked, otherwise missing
+    p.is_active = True if request.form.get('is_active') in ('1', 'on', 'true', 'True') else False
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash(f'A product named {request.form.get("name")!r} already exists', 'error')
+        return redirect(url_for('.admin_products'))
+    invalidate_catalog()
+    index_product(p)
+    flash('Product updated', 'success')
+    return redirect(url_for('.admin_products'))
+
+
+@bp.route('/products/<int:pid>/delete', methods=['POST'])
+@admin_required
+def admin_delete_product(pid):
+    p = Product.query.get_or_404(pid)
+    product_id = p.id
+    db.session.delete(p)
+    db.session.commit()
+    invalidate_dashboard_counts()
+    invalidate_catalog()
+    unindex_product(product_id)
+    flash('Product deleted', 'success')
+    return redirect(url_for('.admin_products'))
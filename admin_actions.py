@@ -0,0 +1,90 @@
+"""Status changes for many orders or prescriptions at once.
+
+Each batch loads its rows in one query, validates every id, and writes
+the new status with one set-based UPDATE. It returns a result per id
+({'id', 'ok', 'status'|'error'}) so the admin pages can show which rows
+were skipped and why. The single-row admin routes use the same code, so
+a one-row change and a 200-row change behave the same: rollups, customer
+notifications and, for delivered orders, archiving of linked
+prescriptions (archive.py) happen in the same transaction. The caller
+commits, then moves legacy archived files.
+"""
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
+
+from analytics import record_status_changes
+from archive import archive_for_orders
+from models import db, Order, Prescription
+from notifications import notify_order_status, notify_prescription_status
+
+ORDER_STATUSES = ('pending', 'delivered', 'cancelled')
+# 'received' and 'failed' come from upload post-processing (uploads.py); failed ones can be re-queued
+PRESCRIPTION_STATUSES = ('received', 'failed', 'pending', 'processing', 'ready', 'completed', 'rejected')
+MAX_BULK_IDS = 500
+
+
+class BulkActionError(ValueError):
+    """The request as a whole is invalid (bad status or id list)."""
+
+
+def parse_ids(ids):
+    """Unique integer ids in request order."""
+    if not isinstance(ids, list) or not ids:
+        raise BulkActionError('Select at least one row')
+    if len(ids) > MAX_BULK_IDS:
+        raise BulkActionError(f'At most {MAX_BULK_IDS} rows per request')
+    try:
+        return list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        raise BulkActionError('ids must be whole numbers')
+
+
+def _validate(ids, rows, new_status):
+    results, changed = [], []
+    for row_id in ids:
+        row = rows.get(row_id)
+        if row is None:
+            results.append({'id': row_id, 'ok': False, 'error': 'not found'})
+        elif row.status == new_status:
+            results.append({'id': row_id, 'ok': True, 'status': new_status, 'unchanged': True})
+        else:
+            results.append({'id': row_id, 'ok': True, 'status': new_status, 'previous': row.status})
+            changed.append(row)
+    return results, changed
+
+
+def change_order_statuses(ids, new_status):
+    """Set new_status on orders; returns (results, archived count, legacy files to move)."""
+    if new_status not in ORDER_STATUSES:
+        raise BulkActionError(f'Unknown order status {new_status!r}')
+    ids = parse_ids(ids)
+    # locked so the rollup deltas are computed from the status actually replaced
+    orders = {o.id: o for o in Order.query.filter(Order.id.in_(ids))
+              .options(selectinload(Order.user)).with_for_update()}
+    results, changed = _validate(ids, orders, new_status)
+    archived, files = 0, []
+    if changed:
+        record_status_changes([(o, o.status) for o in changed], new_status)
+        for order in changed:
+            notify_order_status(order, new_status)
+        db.session.execute(update(Order).where(Order.id.in_([o.id for o in changed]))
+                           .values(status=new_status))
+        if new_status == 'delivered':
+            archived, files = archive_for_orders([o.id for o in changed])
+    return results, archived, files
+
+
+def change_prescription_statuses(ids, new_status):
+    """Set new_status on prescriptions; returns results."""
+    if new_status not in PRESCRIPTION_STATUSES:
+        raise BulkActionError(f'Unknown prescription status {new_status!r}')
+    ids = parse_ids(ids)
+    prescriptions = {p.id: p for p in Prescription.query.filter(Prescription.id.in_(ids))
+                     .options(selectinload(Prescription.user))}
+    results, changed = _validate(ids, prescriptions, new_status)
+    if changed:
+        for prescription in changed:
+            notify_prescription_status(prescription, new_status)
+        db.session.execute(update(Prescription).where(Prescription.id.in_([p.id for p in changed]))
+                           .values(status=new_status))
+    return results
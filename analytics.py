@@ -0,0 +1,312 @@
+"""Daily sales rollups for the admin reports.
+
+Three small tables (see models.py) hold per-day totals: DailySales
+(orders, revenue, units, delivered/cancelled counts), DailyProductSales
+(units and revenue per product, with its category) and DailyOrderSplit
+(orders and revenue per delivery_type / payment_method). The report
+pages read only from them, so their cost depends on the date range, not
+on order volume.
+
+Checkout does not touch them: every order on a day would otherwise wait
+on that day's DailySales row. record_order() enqueues a 'rollup' job in
+the checkout transaction and the job worker (jobs.py) adds a batch of
+orders at a time, in the transaction that marks the jobs done, so each
+order is counted exactly once, a few seconds after it is placed. Admin
+status changes still adjust the rollups as they commit; the deltas add
+up the same whichever runs first.
+
+Days are UTC order dates. Cancelling an order takes it back out of the
+day it was placed on. rebuild_rollups() recomputes a date range from
+orders and order_items plus their archive tables (archive.py), for
+history or after a manual data fix.
+
+Run:
+    python analytics.py --backfill [--start 2024-01-01] [--end 2024-12-31]
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, delete, func, select, union_all
+
+from jobs import enqueue, job_handler
+from models import db, Order, OrderItem, OrderArchive, OrderItemArchive, Product
+from models import DailySales, DailyProductSales, DailyOrderSplit
+
+SPLIT_DIMENSIONS = ('delivery_type', 'payment_method')
+BACKFILL_CHUNK_DAYS = 31
+
+# model -> (primary key columns, label columns that are overwritten, not summed)
+_ROLLUPS = {
+    DailySales: (('day',), ()),
+    DailyProductSales: (('day', 'product_id'), ('product_name', 'category')),
+    DailyOrderSplit: (('day', 'dimension', 'value'), ()),
+}
+
+
+def _increment(model, rows):
+    """Add each row's counters to its rollup row, creating it if needed."""
+    if not rows:
+        return
+    keys, labels = _ROLLUPS[model]
+    table = model.__table__
+    counters = [c for c in rows[0] if c not in keys and c not in labels]
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        new = stmt.inserted
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        new = stmt.excluded
+    values = {c: table.c[c] + new[c] for c in counters}
+    values.update({c: new[c] for c in labels})
+    if dialect == 'mysql':
+        stmt = stmt.on_duplicate_key_update(values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=values)
+    db.session.execute(stmt, rows)
+
+
+def _order_lines(order):
+    item = OrderItemArchive if isinstance(order, OrderArchive) else OrderItem
+    return db.session.execute(
+        select(item.product_id, item.product_name, item.qty, item.price,
+               func.coalesce(Product.category, 'other').label('category'))
+        .outerjoin(Product, Product.id == item.product_id)
+        .where(item.order_id == order.id)
+    ).all()
+
+
+def _apply(order, sign, **sales_extra):
+    """Add (sign=1) or remove (sign=-1) an order's contribution to its day."""
+    day = order.created_at.date()
+    products = {}
+    for line in _order_lines(order):
+        row = products.setdefault(line.product_id, {
+            'day': day, 'product_id': line.product_id, 'product_name': line.product_name,
+            'category': line.category, 'units': 0, 'revenue': 0})
+        row['units'] += sign * line.qty
+        row['revenue'] += sign * line.qty * line.price
+    units = sum(row['units'] for row in products.values())
+    _increment(DailySales, [dict({'day': day, 'orders': sign, 'revenue': sign * order.total,
+                                  'units': units}, **sales_extra)])
+    _increment(DailyProductSales, list(products.values()))
+    for dimension in SPLIT_DIMENSIONS:
+        _increment(DailyOrderSplit, [{'day': day, 'dimension': dimension,
+                                      'value': getattr(order, dimension) or 'unknown',
+                                      'orders': sign, 'revenue': sign * order.total}])
+
+
+def record_order(order):
+    """Queue a new order for the rollups (call before committing the checkout)."""
+    db.session.flush()
+    enqueue('rollup', {'order_id': order.id})
+
+
+@job_handler('rollup')
+def apply_placed_orders(payloads):
+    """Add placed orders to their day; the worker commits this with the job rows."""
+    errors = []
+    for payload in payloads:
+        try:
+            with db.session.begin_nested():
+                # counted as placed; a cancellation since then has already taken it back out
+                order = (db.session.get(Order, payload['order_id'])
+                         or db.session.get(OrderArchive, payload['order_id']))
+                if order is None:
+                    raise LookupError(f"order {payload['order_id']} not found")
+                _apply(order, 1)
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+
+def record_status_change(order, old_status, new_status):
+    """Adjust the rollups for an admin status change (before the commit)."""
+    if old_status == new_status:
+        return
+    day = order.created_at.date()
+    delivered = (new_status == 'delivered') - (old_status == 'delivered')
+    if new_status == 'cancelled':
+        _apply(order, -1, delivered_orders=delivered, cancelled_orders=1, cancelled_revenue=order.total)
+    elif old_status == 'cancelled':
+        _apply(order, 1, delivered_orders=delivered, cancelled_orders=-1, cancelled_revenue=-order.total)
+    elif delivered:
+        _increment(DailySales, [{'day': day, 'delivered_orders': delivered}])
+
+
+def record_status_changes(changes, new_status):
+    """record_status_change for a batch of (order, old_status) pairs.
+
+    Delivered counts are summed per day into one statement; cancellations
+    still adjust each order's products and splits.
+    """
+    delivered_by_day = {}
+    for order, old_status in changes:
+        if old_status == new_status:
+            continue
+        if new_status == 'cancelled' or old_status == 'cancelled':
+            record_status_change(order, old_status, new_status)
+            continue
+        day = order.created_at.date()
+        delivered = (new_status == 'delivered') - (old_status == 'delivered')
+        delivered_by_day[day] = delivered_by_day.get(day, 0) + delivered
+    _increment(DailySales, [{'day': day, 'delivered_orders': n}
+                            for day, n in sorted(delivered_by_day.items()) if n])
+
+
+def _as_date(value):
+    # func.date() gives a date on MySQL and an ISO string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _placed_between(start, end):
+    """Orders and order lines placed start..end, live and archived, as two subqueries."""
+    begin = datetime.combine(start, datetime.min.time())
+    stop = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    orders = union_all(*[
+        select(o.created_at, o.status, o.total, *[getattr(o, d) for d in SPLIT_DIMENSIONS])
+        .where(o.created_at >= begin, o.created_at < stop)
+        for o in (Order, OrderArchive)
+    ]).subquery('placed_orders')
+    items = union_all(*[
+        select(o.created_at, o.status, i.product_id, i.product_name, i.qty, i.price)
+        .join(o, o.id == i.order_id).where(o.created_at >= begin, o.created_at < stop)
+        for o, i in ((Order, OrderItem), (OrderArchive, OrderItemArchive))
+    ]).subquery('placed_items')
+    return orders.c, items.c
+
+
+def _rebuild_chunk(start, end):
+    """Recompute rollups for days start..end (inclusive) in one transaction."""
+    for model in _ROLLUPS:
+        db.session.execute(delete(model).where(model.day >= start, model.day <= end))
+
+    o, i = _placed_between(start, end)
+    day = func.date(o.created_at).label('day')
+    live = o.status != 'cancelled'
+    item_day = func.date(i.created_at).label('day')
+    item_live = i.status != 'cancelled'
+
+    sales = {}
+    for row in db.session.execute(
+            select(day,
+                   func.sum(case((live, 1), else_=0)),
+                   func.sum(case((live, o.total), else_=0)),
+                   func.sum(case((o.status == 'delivered', 1), else_=0)),
+                   func.sum(case((live, 0), else_=1)),
+                   func.sum(case((live, 0), else_=o.total)))
+            .group_by(day)):
+        sales[_as_date(row[0])] = {
+            'day': _as_date(row[0]), 'orders': row[1], 'revenue': row[2], 'units': 0,
+            'delivered_orders': row[3], 'cancelled_orders': row[4], 'cancelled_revenue': row[5]}
+    for row in db.session.execute(
+            select(item_day, func.sum(i.qty)).where(item_live).group_by(item_day)):
+        sales[_as_date(row[0])]['units'] = row[1]
+    if sales:
+        db.session.execute(DailySales.__table__.insert(), list(sales.values()))
+
+    products = [
+        {'day': _as_date(r[0]), 'product_id': r[1], 'product_name': r[2], 'category': r[3],
+         'units': r[4], 'revenue': r[5]}
+        for r in db.session.execute(
+            select(item_day, i.product_id, func.max(i.product_name),
+                   func.coalesce(func.max(Product.category), 'other'),
+                   func.sum(i.qty), func.sum(i.qty * i.price))
+            .outerjoin(Product, Product.id == i.product_id)
+            .where(item_live).group_by(item_day, i.product_id))
+    ]
+    if products:
+        db.session.execute(DailyProductSales.__table__.insert(), products)
+
+    splits = []
+    for dimension in SPLIT_DIMENSIONS:
+        column = o[dimension]
+        splits += [
+            {'day': _as_date(r[0]), 'dimension': dimension, 'value': r[1] or 'unknown',
+             'orders': r[2], 'revenue': r[3]}
+            for r in db.session.execute(
+                select(day, column, func.count(), func.sum(o.total))
+                .where(live).group_by(day, column))
+        ]
+    if splits:
+        db.session.execute(DailyOrderSplit.__table__.insert(), splits)
+    db.session.commit()
+
+
+def rebuild_rollups(start=None, end=None, chunk_days=BACKFILL_CHUNK_DAYS):
+    """Recompute the rollups from orders for start..end (default: all history).
+
+    Works in chunks of chunk_days, one transaction each, so checkouts are
+    never blocked for long. Returns the number of days covered.
+    """
+    if start is None:
+        firsts = [db.session.execute(select(func.min(model.created_at))).scalar()
+                  for model in (Order, OrderArchive)]
+        firsts = [f for f in firsts if f is not None]
+        if not firsts:
+            return 0
+        start = min(firsts).date()
+    end = end or datetime.utcnow().date()
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        _rebuild_chunk(chunk_start, chunk_end)
+        print(f'Rebuilt rollups for {chunk_start} .. {chunk_end}')
+        chunk_start = chunk_end + timedelta(days=1)
+    return (end - start).days + 1
+
+
+def sales_report(start, end, top=10):
+    """Everything the admin reports page shows for start..end, from rollups only."""
+    days = (DailySales.query.filter(DailySales.day >= start, DailySales.day <= end)
+            .order_by(DailySales.day).all())
+    totals = {field: sum(getattr(d, field) for d in days)
+              for field in ('orders', 'revenue', 'units', 'delivered_orders', 'cancelled_orders')}
+    in_range = (DailyProductSales.day >= start, DailyProductSales.day <= end)
+    revenue = func.sum(DailyProductSales.revenue)
+    top_products = db.session.execute(
+        select(DailyProductSales.product_id, func.max(DailyProductSales.product_name).label('name'),
+               func.sum(DailyProductSales.units).label('units'), revenue.label('revenue'))
+        .where(*in_range).group_by(DailyProductSales.product_id)
+        .having(func.sum(DailyProductSales.units) != 0)
+        .order_by(revenue.desc()).limit(top)
+    ).all()
+    categories = db.session.execute(
+        select(DailyProductSales.category, func.sum(DailyProductSales.units).label('units'),
+               revenue.label('revenue'))
+        .where(*in_range).group_by(DailyProductSales.category)
+        .having(func.sum(DailyProductSales.units) != 0).order_by(revenue.desc())
+    ).all()
+    splits = {dimension: [] for dimension in SPLIT_DIMENSIONS}
+    for row in db.session.execute(
+            select(DailyOrderSplit.dimension, DailyOrderSplit.value,
+                   func.sum(DailyOrderSplit.orders).label('orders'),
+                   func.sum(DailyOrderSplit.revenue).label('revenue'))
+            .where(DailyOrderSplit.day >= start, DailyOrderSplit.day <= end)
+            .group_by(DailyOrderSplit.dimension, DailyOrderSplit.value)
+            .having(func.sum(DailyOrderSplit.orders) != 0)  # rows emptied by cancellations
+            .order_by(func.sum(DailyOrderSplit.revenue).desc())):
+        splits.setdefault(row.dimension, []).append(row)
+    return {'days': days, 'totals': totals, 'top_products': top_products,
+            'categories': categories, 'splits': splits}
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Maintain the daily sales rollups')
+    parser.add_argument('--backfill', action='store_true', help='recompute rollups from orders')
+    parser.add_argument('--start', type=date.fromisoformat, help='first day (YYYY-MM-DD)')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day (YYYY-MM-DD), default today')
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error('nothing to do; pass --backfill')
+    with app.app_context():
+        print(f'Rebuilt {rebuild_rollups(args.start, args.end)} days')
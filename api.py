@@ -0,0 +1,373 @@
+"""JSON API: catalog, prescription uploads, cart and orders."""
+import hashlib
+import os
+
+from flask import Blueprint, current_app, jsonify, request, session
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from addresses import resolve_address
+from analytics import record_order
+from auth import cached_user, login_required
+from blobstore import store_blob
+from cart import CartError, get_cart, apply_changes, clear_cart, checkout_lines
+from catalog import query_catalog, search_catalog, apply_stock_changes, CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE
+from config import read_replica
+from dashboard import invalidate_dashboard_counts
+from idempotency import IdempotencyError, claim_key, save_response
+from models import db, Order, OrderItem, Prescription, Product
+from notifications import notify_order_placed
+from search import SEARCH_RESULT_LIMIT
+from shop import order_history_page, prescription_history
+from stock import reserve_stock, InsufficientStock
+from uploads import UploadStream, submit_post_processing
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+ALLOWED_PRESCRIPTION_EXT = {'pdf', 'png', 'jpg', 'jpeg'}
+
+
+@bp.route('/products')
+def api_products():
+    """Catalog listing served from the in-process cache, with ETag/304 support."""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', CATALOG_PAGE_SIZE, type=int)
+    result = query_catalog(category=request.args.get('category'),
+                           q=request.args.get('q'),
+                           page=page, per_page=per_page)
+    version = result.pop('version')
+    etag = None
+    if version:
+        # the same catalog version answered with different filters is a different resource
+        etag = hashlib.sha1(f'{version}?{request.query_string.decode()}'.encode()).hexdigest()
+        if etag in request.if_none_match:
+            resp = current_app.response_class(status=304)
+            resp.set_etag(etag)
+            return resp
+    resp = jsonify(result)
+    if etag:
+        resp.set_etag(etag)
+    return resp
+
+
+@bp.route('/products/search')
+def api_product_search():
+    """Typeahead: best-ranked active products for a (partial) query."""
+    q = request.args.get('q', '').strip()
+    limit = min(max(1, request.args.get('limit', SEARCH_RESULT_LIMIT, type=int)), CATALOG_MAX_PAGE_SIZE)
+    if not q:
+        return jsonify({'products': []})
+    return jsonify({'products': search_catalog(q, limit)})
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_PRESCRIPTION_EXT
+
+
+@bp.route('/prescriptions/upload', methods=['POST'])
+@login_required
+def upload_prescription():
+    try:
+        if 'prescription' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['prescription']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': f'File type not allowed. Allowed types: {", ".join(ALLOWED_PRESCRIPTION_EXT)}'}), 400
+        
+        # Get form data
+        doctor_name = request.form.get('doctor_name', '')
+        
+        # The body was already streamed to disk while parsing; file it by content
+        upload = file.stream
+        if not isinstance(upload, UploadStream):
+            upload = UploadStream(current_app.config['UPLOAD_FOLDER'],
+                                  current_app.config['MAX_PRESCRIPTION_BYTES'])
+            file.save(upload)
+        upload.finish()
+        ext = file.filename.rsplit('.', 1)[1].lower()
+        relpath, created = store_blob(upload.path, upload.sha256, ext, upload.size)
+        
+        # Create prescription record; a new file becomes 'pending' once post-processed
+        prescription = Prescription(
+            user_id=session['user_id'],
+            filename=relpath,
+            blob_sha256=upload.sha256,
+            doctor_name=doctor_name,
+            type='upload',
+            status='received' if created else 'pending'
+        )
+        
+        db.session.add(prescription)
+        db.session.flush()
+        prescription.assign_number()
+        db.session.commit()
+        if upload is not file.stream:
+            upload.close()
+        invalidate_dashboard_counts()
+        if created:
+            submit_post_processing(prescription.id, os.path.join(current_app.config['UPLOAD_FOLDER'], relpath),
+                                   upload.sha256)
+        
+        return jsonify({
+            'message': 'Prescription uploaded successfully',
+            'prescription': prescription.to_dict()
+        })
+        
+    except RequestEntityTooLarge:
+        max_mb = current_app.config['MAX_PRESCRIPTION_BYTES'] // (1024 * 1024)
+        return jsonify({'error': f'File too large. Maximum size is {max_mb} MB'}), 413
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Prescription upload failed')
+        return jsonify({'error': 'Could not upload prescription'}), 500
+
+
+@bp.route('/cart')
+def api_cart():
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to use the cart.'}), 401
+    return jsonify(get_cart(session['user_id']))
+
+
+@bp.route('/cart', methods=['POST'])
+def api_cart_update():
+    """Apply deltas: {"changes": [{"product_id": 7, "delta": 1}, {"product_id": 3, "qty": 0}]}."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to use the cart.'}), 401
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes', [data] if data else [])
+    try:
+        apply_changes(session['user_id'], changes)
+        db.session.commit()
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Cart update failed')
+        return jsonify({'error': 'Could not update cart'}), 500
+    return jsonify(get_cart(session['user_id']))
+
+
+@bp.route('/cart', methods=['DELETE'])
+def api_cart_clear():
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to use the cart.'}), 401
+    clear_cart(session['user_id'])
+    db.session.commit()
+    return jsonify(get_cart(session['user_id']))
+
+
+@bp.route('/prescriptions')
+@read_replica
+def api_prescriptions():
+    """The customer's prescriptions, newest first: ?archived=1 lists archived ones."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to see your prescriptions.'}), 401
+    user_prescriptions = prescription_history(session['user_id'], bool(request.args.get('archived')))
+    return jsonify({'prescriptions': [p.to_dict() for p in user_prescriptions]})
+
+
+@bp.route('/orders')
+@read_replica
+def api_orders():
+    """One page of the customer's orders for infinite scroll: ?cursor=<next_cursor>[&archived=1]."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'Please log in to see your orders.'}), 401
+    try:
+        user_orders, next_cursor = order_history_page(session['user_id'], request.args.get('cursor'),
+                                                      bool(request.args.get('archived')))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    result = []
+    for order in user_orders:
+        data = order.to_dict()
+        data['items'] = [{'product_id': i.product_id, 'product_name': i.product_name,
+                          'qty': i.qty, 'price': i.price} for i in order.items]
+        data['address'] = order.address.to_dict() if order.address else None
+        result.append(data)
+    return jsonify({'orders': result, 'next_cursor': next_cursor})
+
+
+def resolve_order_products(order_items):
+    """Load all products referenced by the cart in one query, keyed by name.
+
+    Names that are not in the catalog yet get a product created for them
+    (same defaults as before), each in a savepoint: if a concurrent
+    checkout created the same name first, its product is used instead.
+    Such a product takes the posted price, so it is created inactive and
+    only shows in the catalog once an admin has checked it.
+    """
+    names = {item['product_name'] for item in order_items}
+    if not names:
+        return {}
+    products = Product.query.filter(Product.name.in_(names)).all()
+    by_name = {p.name: p for p in products}
+
+    for item in order_items:
+        name = item['product_name']
+        if name in by_name:
+            continue
+        product = Product(
+            name=name,
+            price=item['price'],
+            category='other',
+            stock=100,
+            is_active=False
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(product)  # flushed on exit, so it has an id
+        except IntegrityError:
+            # a locking read sees the other checkout's committed row despite our snapshot
+            product = Product.query.filter_by(name=name).with_for_update(read=True).one()
+        by_name[name] = product
+    return by_name
+
+
+@bp.route('/orders', methods=['POST'])
+def create_order():
+    """API endpoint for creating new orders."""
+    try:
+        # Require authentication
+        if not session.get('user_id'):
+            return jsonify({'error': 'Please log in to place orders.'}), 401
+
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        # {"from_cart": true} checks out the server-side cart (cart.py) instead of posted items
+        from_cart = bool(data.get('from_cart'))
+
+        # validate required fields
+        required = ['customer_name', 'phone', 'streetAddress', 'city', 'delivery_type', 'payment_method']
+        if not from_cart:
+            required.append('items')
+        missing = [f for f in required if not data.get(f)]
+        if missing:
+            return jsonify({'error': f'Missing required fields: {", ".join(missing)}'}), 400
+
+        if not from_cart and not data['items']:
+            return jsonify({'error': 'Cart is empty'}), 400
+
+        # retries of one submission share an Idempotency-Key; claimed before any other query
+        idempotency_record = None
+        if 'Idempotency-Key' in request.headers:
+            try:
+                idempotency_record, replay = claim_key(session['user_id'], request.headers['Idempotency-Key'], data)
+            except IdempotencyError as e:
+                return jsonify({'error': str(e)}), 422
+            if replay is not None:
+                return jsonify(replay), 200, {'Idempotent-Replayed': 'true'}
+
+        # calculate order total including delivery fee
+        items_total = 0
+        order_items = []
+
+        if from_cart:
+            # already validated line by line as it was filled; priced from the catalog
+            try:
+                lines = checkout_lines(session['user_id'])
+            except CartError as e:
+                return jsonify({'error': str(e)}), 400
+            for line in lines:
+                items_total += line.qty * line.price
+                order_items.append({'product_id': line.product_id, 'qty': line.qty,
+                                    'price': line.price, 'product_name': line.name})
+
+        for item in ([] if from_cart else data['items']):
+            if not isinstance(item, dict):  # handle raw cart format
+                continue
+            qty = int(item.get('qty', 1))
+            if qty < 1:
+                return jsonify({'error': 'Item quantity must be at least 1'}), 400
+            order_items.append({
+                'qty': qty,
+                'price': int(item.get('price', 0)),  # only used for a product created below
+                'product_name': item.get('name', '')
+            })
+
+        if not from_cart:
+            # resolve every product in the posted items with a single query; priced from the catalog
+            products_by_name = resolve_order_products(order_items)
+            for item in order_items:
+                product = products_by_name[item['product_name']]
+                item['product_id'], item['product_name'], item['price'] = product.id, product.name, product.price
+                items_total += item['qty'] * item['price']
+
+        delivery_fee = 60 if data['delivery_type'] == 'express' else 30
+        total = items_total + delivery_fee
+
+        # get user
+        user_id = session.get('user_id')
+        user = cached_user(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        # reuse the saved address with the same normalised street+city, else save it
+        address = resolve_address(
+            user_id,
+            data.get('streetAddress', ''),
+            data.get('city', ''),
+            recipient_name=data['customer_name'],
+            phone=data['phone'],
+            label='Home'  # default label
+        )
+
+        # create order
+        order = Order(
+            user_id=user_id,  # Set the user_id from the session
+            delivery_type=data['delivery_type'],
+            payment_method=data['payment_method'],
+            total=total,
+            delivery_fee=delivery_fee,
+            address_id=address.id
+        )
+        db.session.add(order)
+
+        quantities = {}
+        for item in order_items:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['qty']
+
+            order_item = OrderItem(
+                order=order,
+                product_id=item['product_id'],
+                product_name=item['product_name'],  # Store the product name at time of order
+                qty=item['qty'],
+                price=item['price']
+            )
+            db.session.add(order_item)
+
+        # atomically take stock for the whole cart (rolls back on failure)
+        try:
+            reserve_stock(quantities)
+        except InsufficientStock as e:
+            return jsonify({'error': str(e)}), 400
+
+        if from_cart:
+            clear_cart(user_id)
+        # daily sales rollups, in the same transaction as the order
+        record_order(order)
+        # confirmation email goes out from the job worker once this commits
+        notify_order_placed(order, user)
+        result = {
+            'order_id': order.id,
+            'total': total,
+            'delivery_fee': delivery_fee
+        }
+        if idempotency_record is not None:
+            save_response(idempotency_record, order.id, result)
+        db.session.commit()
+        invalidate_dashboard_counts()
+        apply_stock_changes(quantities)
+        return jsonify(result)
+
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Order creation failed')
+        return jsonify({'error': 'Could not create order'}), 500
@@ -0,0 +1,263 @@
+"""Archiving of closed orders and finished prescriptions.
+
+Two paths move rows out of the working tables, each with set-based
+INSERT ... SELECT / DELETE statements in one transaction per batch:
+
+- archive_for_orders() runs when orders are marked delivered and moves
+  the prescriptions they were filled against to prescription_archives.
+- run_retention() moves delivered/cancelled orders (with their items)
+  older than ORDER_ARCHIVE_AFTER_DAYS to order_archives and
+  order_item_archives, and completed/rejected prescriptions older than
+  PRESCRIPTION_ARCHIVE_AFTER_DAYS to prescription_archives and, if
+  PRESCRIPTION_PURGE_AFTER_DAYS is set, deletes archived prescriptions
+  archived longer ago than that. It runs as the daily 'retention' job
+  (see jobs.py) or from the command line:
+
+    python archive.py --retention [--order-days 365] [--prescription-days 365] [--purge-days 0]
+
+A prescription that another open (not delivered, not cancelled) order
+still uses, e.g. a refill in progress, stays put. Archived orders keep
+their ids and archived rows have the same to_dict() shape as live ones;
+sales rollups are rebuilt from both tables (analytics.py).
+
+Files in the blob store are shared and stay where they are; the archive
+row takes over the prescription's blob reference, and a purged row
+releases it (`python blobstore.py --gc` then removes blobs nobody uses).
+Legacy files are moved to UPLOAD_FOLDER/archived by move_archived_files()
+after the commit, and purged ones deleted, so a rolled-back batch never
+leaves files in the wrong place.
+"""
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, delete, exists, func, insert, literal, select, update
+from sqlalchemy.orm import aliased
+
+from blobstore import release_blob
+from jobs import enqueue, job_handler
+from models import db, Order, OrderItem, OrderArchive, OrderItemArchive, Prescription, PrescriptionArchive
+
+ARCHIVE_DIR = 'archived'  # under UPLOAD_FOLDER
+OPEN_ORDER_EXCLUDED = ('delivered', 'cancelled')
+CLOSED_PRESCRIPTION_STATUSES = ('completed', 'rejected')
+ORDER_ARCHIVE_AFTER_DAYS = 365
+PRESCRIPTION_ARCHIVE_AFTER_DAYS = 365
+PRESCRIPTION_PURGE_AFTER_DAYS = 0  # after archiving; 0 keeps archived prescriptions for good
+RETENTION_BATCH_SIZE = 500
+RETENTION_MAX_BATCHES = 20  # per job run; a follow-up job continues with the rest
+
+
+def _still_needed():
+    other = aliased(Order)
+    return exists().where(other.prescription_id == Prescription.id,
+                          other.status.notin_(OPEN_ORDER_EXCLUDED))
+
+
+def _archive_prescriptions(rows, order_id):
+    """Move prescriptions (rows of id, filename, blob_sha256) to the archive; returns legacy files."""
+    ids = [r.id for r in rows]
+    filename = case((Prescription.blob_sha256.is_(None), literal(ARCHIVE_DIR + '/') + Prescription.filename),
+                    else_=Prescription.filename)
+    db.session.execute(insert(PrescriptionArchive).from_select(
+        ['original_id', 'user_id', 'order_id', 'prescription_number', 'filename', 'blob_sha256',
+         'doctor_name', 'status', 'type', 'uploaded_at', 'claimed_by', 'claimed_at', 'archived_at'],
+        select(Prescription.id, Prescription.user_id, order_id, Prescription.prescription_number,
+               filename, Prescription.blob_sha256, Prescription.doctor_name, Prescription.status,
+               Prescription.type, Prescription.uploaded_at, Prescription.claimed_by,
+               Prescription.claimed_at, literal(datetime.utcnow()))
+        .where(Prescription.id.in_(ids))))
+    db.session.execute(update(Order).where(Order.prescription_id.in_(ids))
+                       .values(prescription_id=None).execution_options(synchronize_session=False))
+    db.session.execute(delete(Prescription).where(Prescription.id.in_(ids))
+                       .execution_options(synchronize_session=False))
+    return [r.filename for r in rows if not r.blob_sha256]
+
+
+def archive_for_orders(order_ids):
+    """Archive prescriptions of these delivered orders; returns (count, legacy filenames)."""
+    if not order_ids:
+        return 0, []
+    rows = db.session.execute(
+        select(Prescription.id, Prescription.filename, Prescription.blob_sha256)
+        .join(Order, Order.prescription_id == Prescription.id)
+        .where(Order.id.in_(order_ids), ~_still_needed())
+        .distinct()
+    ).all()
+    if not rows:
+        return 0, []
+    order_id = (select(func.min(Order.id))
+                .where(Order.prescription_id == Prescription.id, Order.id.in_(order_ids))
+                .scalar_subquery())
+    return len(rows), _archive_prescriptions(rows, order_id)
+
+
+def archive_orders(order_ids):
+    """Move orders and their items to the archive tables (caller commits)."""
+    now = datetime.utcnow()
+    columns = ['id', 'user_id', 'total', 'status', 'delivery_type', 'payment_method', 'address_id',
+               'delivery_fee', 'created_at', 'prescription_id']
+    db.session.execute(insert(OrderArchive).from_select(
+        columns + ['archived_at'],
+        select(*[getattr(Order, c) for c in columns], literal(now)).where(Order.id.in_(order_ids))))
+    item_columns = ['id', 'order_id', 'product_id', 'product_name', 'qty', 'price']
+    db.session.execute(insert(OrderItemArchive).from_select(
+        item_columns, select(*[getattr(OrderItem, c) for c in item_columns])
+        .where(OrderItem.order_id.in_(order_ids))))
+    db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(delete(Order).where(Order.id.in_(order_ids))
+                       .execution_options(synchronize_session=False))
+
+
+def _archive_order_batch(cutoff, batch_size):
+    # oldest first along ix_orders_created_at_id; skip rows a checkout or admin holds
+    ids = db.session.execute(
+        select(Order.id).where(Order.created_at < cutoff, Order.status.in_(OPEN_ORDER_EXCLUDED))
+        .order_by(Order.created_at, Order.id).limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if ids:
+        archive_orders(ids)
+    db.session.commit()
+    return len(ids)
+
+
+def _archive_prescription_batch(cutoff, batch_size):
+    # one range of ix_prescriptions_status_uploaded_at_id per closed status
+    rows = db.session.execute(
+        select(Prescription.id, Prescription.filename, Prescription.blob_sha256)
+        .where(Prescription.status.in_(CLOSED_PRESCRIPTION_STATUSES),
+               Prescription.uploaded_at < cutoff, ~_still_needed())
+        .order_by(Prescription.uploaded_at, Prescription.id).limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    files = []
+    if rows:
+        order_id = func.coalesce(
+            select(func.min(Order.id)).where(Order.prescription_id == Prescription.id).scalar_subquery(),
+            select(func.min(OrderArchive.id)).where(OrderArchive.prescription_id == Prescription.id)
+            .scalar_subquery())
+        files = _archive_prescriptions(rows, order_id)
+    db.session.commit()
+    move_archived_files(files)
+    return len(rows)
+
+
+def _purge_archived_prescription_batch(cutoff, batch_size):
+    rows = db.session.execute(
+        select(PrescriptionArchive.id, PrescriptionArchive.filename, PrescriptionArchive.blob_sha256)
+        .where(PrescriptionArchive.archived_at < cutoff)
+        .order_by(PrescriptionArchive.archived_at, PrescriptionArchive.id).limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if rows:
+        for row in rows:
+            release_blob(row.blob_sha256)
+        db.session.execute(delete(PrescriptionArchive).where(PrescriptionArchive.id.in_([r.id for r in rows]))
+                           .execution_options(synchronize_session=False))
+    db.session.commit()
+    remove_purged_files([r.filename for r in rows if not r.blob_sha256])
+    return len(rows)
+
+
+def run_retention(order_days=ORDER_ARCHIVE_AFTER_DAYS, prescription_days=PRESCRIPTION_ARCHIVE_AFTER_DAYS,
+                  batch_size=RETENTION_BATCH_SIZE, max_batches=None, purge_days=PRESCRIPTION_PURGE_AFTER_DAYS):
+    """Archive (and purge) what is past retention, a batch per transaction; 0/None days skips a step.
+
+    Returns (orders archived, prescriptions archived, archived prescriptions
+    purged, True if max_batches stopped it early).
+    """
+    now = datetime.utcnow()
+    counts = [0, 0, 0]
+    batches = 0
+    for i, (days, archive_batch) in enumerate(((order_days, _archive_order_batch),
+                                               (prescription_days, _archive_prescription_batch),
+                                               (purge_days, _purge_archived_prescription_batch))):
+        if not days:
+            continue
+        cutoff = now - timedelta(days=days)
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                return counts[0], counts[1], counts[2], True
+            moved = archive_batch(cutoff, batch_size)
+            batches += 1
+            counts[i] += moved
+            if moved < batch_size:
+                break
+    return counts[0], counts[1], counts[2], False
+
+
+@job_handler('retention')
+def run_retention_jobs(payloads):
+    config = current_app.config
+    errors = []
+    for payload in payloads:
+        try:
+            orders, prescriptions, purged, more = run_retention(
+                config.get('ORDER_ARCHIVE_AFTER_DAYS', ORDER_ARCHIVE_AFTER_DAYS),
+                config.get('PRESCRIPTION_ARCHIVE_AFTER_DAYS', PRESCRIPTION_ARCHIVE_AFTER_DAYS),
+                config.get('RETENTION_BATCH_SIZE', RETENTION_BATCH_SIZE),
+                config.get('RETENTION_MAX_BATCHES', RETENTION_MAX_BATCHES),
+                config.get('PRESCRIPTION_PURGE_AFTER_DAYS', PRESCRIPTION_PURGE_AFTER_DAYS))
+            print(f'Retention: archived {orders} orders and {prescriptions} prescriptions, '
+                  f'purged {purged} archived prescriptions')
+            if more:
+                part = payload.get('part', 0) + 1
+                enqueue('retention', {'part': part},
+                        idempotency_key=f'retention:{datetime.utcnow():%Y-%m-%d}:{part}')
+                db.session.commit()
+            errors.append(None)
+        except Exception as e:
+            db.session.rollback()
+            errors.append(e)
+    return errors
+
+
+def move_archived_files(filenames):
+    """Move legacy prescription files into the archive folder (after commit)."""
+    folder = current_app.config['UPLOAD_FOLDER']
+    archive_dir = os.path.join(folder, ARCHIVE_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+    for name in filenames:
+        try:
+            os.replace(os.path.join(folder, name), os.path.join(archive_dir, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'Could not archive prescription file {name}:', str(e))
+
+
+def remove_purged_files(filenames):
+    """Delete legacy files of purged archived prescriptions (after commit)."""
+    folder = current_app.config['UPLOAD_FOLDER']
+    for name in filenames:
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'Could not remove prescription file {name}:', str(e))
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Archive old orders and prescriptions')
+    parser.add_argument('--retention', action='store_true', help='archive everything past retention')
+    parser.add_argument('--order-days', type=int, default=app.config.get('ORDER_ARCHIVE_AFTER_DAYS', ORDER_ARCHIVE_AFTER_DAYS))
+    parser.add_argument('--prescription-days', type=int,
+                        default=app.config.get('PRESCRIPTION_ARCHIVE_AFTER_DAYS', PRESCRIPTION_ARCHIVE_AFTER_DAYS))
+    parser.add_argument('--purge-days', type=int,
+                        default=app.config.get('PRESCRIPTION_PURGE_AFTER_DAYS', PRESCRIPTION_PURGE_AFTER_DAYS),
+                        help='delete archived prescriptions archived this many days ago (0: never)')
+    parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+    args = parser.parse_args()
+    if not args.retention:
+        parser.error('nothing to do; pass --retention')
+    with app.app_context():
+        orders, prescriptions, purged, _ = run_retention(args.order_days, args.prescription_days, args.batch_size,
+                                                         purge_days=args.purge_days)
+        print(f'{orders} orders and {prescriptions} prescriptions archived, {purged} archived prescriptions purged')
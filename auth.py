@@ -0,0 +1,183 @@
+"""Login support: hash upgrades, login rate limiting and a session user cache.
+
+Password hashing is deliberately slow, so its cost is set in one place
+(PASSWORD_HASH_METHOD, see models.py) and every login costs at most one
+hash at that setting. authenticate() re-hashes a password whose stored
+hash uses other parameters, so changing the setting takes effect as
+users log in.
+
+Before any lookup or hashing, each login attempt takes a token from two
+in-memory buckets, one per client IP and one per username. A burst of
+credential stuffing is turned away with 429 after LOGIN_BURST attempts
+instead of pinning the CPUs with hashes. Limits are per process; with N
+workers a client can get up to N times the configured rate. Behind a load
+balancer set TRUSTED_PROXIES (see app.py), or every client shares the
+proxy's address and its bucket.
+
+cached_user() resolves session['user_id'] to a small read-only record
+and keeps it for USER_CACHE_SECONDS, so pages behind login_required do
+not query the users table on every request.
+"""
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import abort, current_app, redirect, request, session, url_for
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+from models import db, User, password_hash_method
+
+MAX_PASSWORD_LENGTH = 256  # longer input is rejected before hashing
+LOGIN_RATE_PER_MINUTE_IP = 10
+LOGIN_BURST_IP = 20
+LOGIN_RATE_PER_MINUTE_USER = 5
+LOGIN_BURST_USER = 10
+USER_CACHE_SECONDS = 60
+USER_CACHE_SIZE = 10000
+
+SessionUser = namedtuple('SessionUser', 'id name username email')
+
+_hash_prefixes = {}  # configured method -> prefix of the hashes it produces
+
+
+def _hash_prefix(method):
+    # werkzeug expands defaults ('scrypt' -> 'scrypt:32768:8:1'); learn the stored form once
+    if method not in _hash_prefixes:
+        _hash_prefixes[method] = generate_password_hash('probe', method=method).split('$', 1)[0]
+    return _hash_prefixes[method]
+
+
+def needs_rehash(password_hash):
+    """True if the stored hash was made with other parameters than configured now."""
+    return password_hash.split('$', 1)[0] != _hash_prefix(password_hash_method())
+
+
+def authenticate(account, password):
+    """Check a User or Admin password, upgrading an outdated hash (the caller commits)."""
+    if not password or len(password) > MAX_PASSWORD_LENGTH:
+        return False
+    if not account.check_password(password):
+        return False
+    if needs_rehash(account.password_hash):
+        account.set_password(password)
+    return True
+
+
+class TokenBucket:
+    """Per-key token buckets: `burst` tokens, refilled at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute, burst, max_keys=100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend a token for key; returns 0 if allowed, else seconds until one is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        # buckets that have refilled are the same as no bucket at all
+        full_after = self.burst / self.rate
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            oldest = sorted(self._buckets, key=lambda k: self._buckets[k][1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
+
+
+def login_retry_after(username, scope='user'):
+    """Take a login token for this client and username; returns seconds to wait, or 0."""
+    by_ip, by_name = current_app.extensions['login_limits']
+    wait_ip = by_ip.take(f'{scope}:{request.remote_addr}')
+    wait_name = by_name.take(f'{scope}:{(username or "").lower()}')
+    return max(wait_ip, wait_name)
+
+
+class UserCache:
+    """Small TTL cache of SessionUser records by id."""
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self._entries = {}  # user_id -> (expires, record)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                return entry[1]
+        row = db.session.execute(
+            select(User.id, User.name, User.username, User.email).where(User.id == user_id)).first()
+        record = SessionUser(*row) if row else None
+        if record is not None:
+            with self._lock:
+                if len(self._entries) >= self.size:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    if len(self._entries) >= self.size:
+                        self._entries.clear()
+                self._entries[user_id] = (now + self.ttl, record)
+        return record
+
+
+def cached_user(user_id):
+    """SessionUser for an id, or None if the user does not exist (any more)."""
+    if not user_id:
+        return None
+    return current_app.extensions['user_cache'].get(user_id)
+
+
+def current_user():
+    return cached_user(session.get('user_id'))
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # cached for a short while, so this rarely touches the users table
+        if current_user() is None:
+            session.pop('user_id', None)
+            session.pop('user_name', None)
+            if 'shop' not in current_app.blueprints:
+                abort(401)  # an API-only worker has no login page to send them to
+            # redirect to login and include next param so user returns here after login
+            return redirect(url_for('shop.login', next=request.path))
+        return f(*args, **kwargs)
+    return decorated
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not session.get('admin_id'):
+            return redirect(url_for('admin.admin_login', next=request.path))
+        return f(*args, **kwargs)
+    return decorated
+
+
+def init_auth(app):
+    config = app.config
+    app.extensions['login_limits'] = (
+        TokenBucket(config.get('LOGIN_RATE_PER_MINUTE_IP', LOGIN_RATE_PER_MINUTE_IP),
+                    config.get('LOGIN_BURST_IP', LOGIN_BURST_IP)),
+        TokenBucket(config.get('LOGIN_RATE_PER_MINUTE_USER', LOGIN_RATE_PER_MINUTE_USER),
+                    config.get('LOGIN_BURST_USER', LOGIN_BURST_USER)),
+    )
+    app.extensions['user_cache'] = UserCache(config.get('USER_CACHE_SECONDS', USER_CACHE_SECONDS),
+                                             config.get('USER_CACHE_SIZE', USER_CACHE_SIZE))
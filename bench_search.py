@@ -0,0 +1,97 @@
+"""Compare the in-memory product search index with a LIKE scan.
+
+Builds a synthetic catalog in an in-memory SQLite database and times
+typeahead-style queries against both.
+
+Run:
+    python bench_search.py [--products 100000] [--repeat 200]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from flask import Flask
+
+from models import db, Product
+from search import SearchIndex
+
+WORDS = ['paracetamol', 'vitamin', 'tablets', 'capsules', 'syrup', 'baby', 'shampoo', 'cream',
+         'gel', 'pain', 'relief', 'omega', 'zinc', 'calcium', 'iron', 'protein', 'herbal',
+         'ashwagandha', 'turmeric', 'antacid', 'allergy', 'cold', 'cough', 'wipes', 'powder']
+CATEGORIES = ['otc', 'baby', 'personal', 'women', 'nutrition', 'ayurveda']
+QUERIES = ['para', 'vit c', 'baby sha', 'pain rel', 'omega', 'tab', 'herbal cap', 'zi', 'q']
+
+
+def make_vocabulary(rnd, size=5000):
+    """Pharmacy words first, then made-up brand/ingredient words."""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rnd.choice(letters) for _ in range(rnd.randint(4, 10)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    # Zipf-like: a few words are everywhere, most are rare
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def make_products(n, seed=7):
+    rnd = random.Random(seed)
+    vocabulary, weights = make_vocabulary(rnd)
+    for i in range(n):
+        name = ' '.join(rnd.choices(vocabulary, weights, k=3)).title()
+        yield {
+            'name': f'{name} {i}',
+            'category': rnd.choice(CATEGORIES),
+            'description': ' '.join(rnd.choices(vocabulary, weights, k=6)),
+            'price': rnd.randint(20, 900),
+            'stock': rnd.randint(0, 200),
+            'is_active': True,
+        }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Product.__table__.insert(), list(make_products(args.products)))
+        db.session.commit()
+
+        start = time.perf_counter()
+        index = SearchIndex.build(Product.query.with_entities(
+            Product.id, Product.name, Product.category, Product.description))
+        print(f'indexed {len(index)} products in {time.perf_counter() - start:.2f}s')
+
+        print(f"{'query':<12} {'index p50':>10} {'index p99':>10} {'LIKE p50':>10} {'LIKE p99':>10}  (ms)")
+        for q in QUERIES:
+            idx = timed(lambda: index.search(q, 10), args.repeat)
+            pattern = f'%{q}%'
+            like = timed(lambda: Product.query.filter(
+                db.or_(Product.name.ilike(pattern), Product.description.ilike(pattern),
+                       Product.category.ilike(pattern))
+            ).limit(10).all(), max(1, args.repeat // 10))
+            print(f'{q:<12} {idx[0]:>10.3f} {idx[1]:>10.3f} {like[0]:>10.3f} {like[1]:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
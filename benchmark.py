@@ -0,0 +1,350 @@
+"""Load test for the checkout, order history, admin and upload paths.
+
+Seeds a database with synthetic users, products, orders and order items
+(bulk inserts, so millions of rows take minutes, not hours), then drives
+the app in-process with a pool of concurrent clients and reports
+throughput, p50/p95/p99 latency and SQL statements per request for each
+scenario. It finishes with an oversell check: many concurrent one-unit
+orders against a product with little stock must never sell more than it
+has. Worker start-up is timed too: a fresh interpreter importing the app
+and running create_app(), as an autoscaled instance would.
+
+Results are written as JSON; pass an earlier file as --baseline to fail
+(exit 1) when a scenario got slower or issues more queries.
+
+Run:
+    python benchmark.py --users 100000 --orders 1000000 --output bench.json
+    python benchmark.py --skip-seed --database-url mysql+pymysql://... --baseline bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+SCENARIOS = ('checkout', 'orders', 'admin_orders', 'admin_dashboard', 'upload')
+SEED_BATCH = 10000
+CATEGORIES = ['otc', 'baby', 'personal', 'women', 'nutrition', 'ayurveda']
+
+_queries = threading.local()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the pharmacy app')
+    parser.add_argument('--database-url', help='defaults to a fresh SQLite file in a temp directory')
+    parser.add_argument('--skip-seed', action='store_true', help='use the data already in the database')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--startup-runs', type=int, default=5, help='cold starts to time (0 skips)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown versus the baseline (0.2 = 20%%)')
+    return parser.parse_args()
+
+
+def _batches(rows, size=SEED_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(db, args, rnd):
+    """Bulk-insert synthetic data with explicit ids; expects empty tables."""
+    from werkzeug.security import generate_password_hash
+    from addresses import address_hash
+    from models import Admin, Address, Order, OrderItem, Product, User
+
+    def insert(model, rows, label):
+        count = 0
+        for batch in _batches(rows):
+            db.session.execute(model.__table__.insert(), batch)
+            db.session.commit()
+            count += len(batch)
+            print(f'  {label}: {count}', file=sys.stderr)
+
+    password = generate_password_hash('bench')  # one hash for everyone; hashing is slow on purpose
+    now = datetime.utcnow()
+    db.session.add(Admin(username='bench-admin', password_hash=password, name='Bench', is_super=True))
+    db.session.commit()
+    insert(User, ({'id': i, 'name': f'User {i}', 'username': f'bench{i}', 'password_hash': password,
+                   'created_at': now} for i in range(1, args.users + 1)), 'users')
+    insert(Address, ({'id': i, 'user_id': i, 'label': 'Home', 'recipient_name': f'User {i}',
+                      'phone': '9000000000', 'street': f'{i} Main Road', 'city': 'Chennai',
+                      'addr_hash': address_hash(f'{i} Main Road', 'Chennai'),
+                      'created_at': now} for i in range(1, args.users + 1)), 'addresses')
+    prices = {i: rnd.randint(20, 900) for i in range(1, args.products + 1)}
+    insert(Product, ({'id': i, 'name': f'Bench Product {i}', 'sku': f'BENCH{i:07d}',
+                      'category': rnd.choice(CATEGORIES), 'price': prices[i], 'stock': 10 ** 6,
+                      'is_active': True, 'description': 'Synthetic product', 'created_at': now}
+                     for i in range(1, args.products + 1)), 'products')
+
+    def orders():
+        for i in range(1, args.orders + 1):
+            user_id = rnd.randint(1, args.users)
+            yield {'id': i, 'user_id': user_id, 'address_id': user_id, 'total': 0,
+                   'status': rnd.choice(['pending', 'processing', 'delivered']),
+                   'delivery_type': 'standard', 'payment_method': 'cod', 'delivery_fee': 30,
+                   'created_at': now - timedelta(seconds=rnd.randint(0, 365 * 86400))}
+
+    def items():
+        item_id = 0
+        for order_id in range(1, args.orders + 1):
+            for product_id in rnd.sample(range(1, args.products + 1), min(args.items_per_order, args.products)):
+                item_id += 1
+                yield {'id': item_id, 'order_id': order_id, 'product_id': product_id,
+                       'product_name': f'Bench Product {product_id}', 'qty': rnd.randint(1, 3),
+                       'price': prices[product_id]}
+
+    insert(Order, orders(), 'orders')
+    insert(OrderItem, items(), 'order_items')
+
+
+def scenario_requests(name, ctx, rnd):
+    """(method, url, request kwargs, session values) for one request of a scenario."""
+    user_id = rnd.randint(1, ctx['users'])
+    if name == 'checkout':
+        picks = rnd.sample(ctx['products'], min(3, len(ctx['products'])))
+        return 'POST', '/api/orders', {'json': {
+            'customer_name': f'User {user_id}', 'phone': '9000000000',
+            'streetAddress': f'{user_id} Main Road', 'city': 'Chennai',
+            'delivery_type': 'standard', 'payment_method': 'cod',
+            'items': [{'name': product, 'price': price, 'qty': 1} for product, price in picks]}}, {'user_id': user_id}
+    if name == 'orders':
+        return 'GET', '/orders', {}, {'user_id': user_id}
+    if name == 'admin_orders':
+        return 'GET', '/admin/orders', {}, {'admin_id': ctx['admin_id']}
+    if name == 'admin_dashboard':
+        return 'GET', '/admin', {}, {'admin_id': ctx['admin_id']}
+    if name == 'upload':
+        # about a third are re-uploads of the same scan, like real users
+        body = ctx['repeat_scan'] if rnd.random() < 0.3 else b'%PDF-1.4\n' + os.urandom(rnd.randint(20, 200) * 1024)
+        return 'POST', '/api/prescriptions/upload', {
+            'data': {'prescription': (io.BytesIO(body), 'scan.pdf'), 'doctor_name': 'Dr Bench'},
+            'content_type': 'multipart/form-data'}, {'user_id': user_id}
+    raise ValueError(f'unknown scenario {name}')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(app, name, ctx, args):
+    """Fire args.requests requests from args.concurrency threads; returns stats."""
+    def worker(worker_id, count):
+        rnd = random.Random(args.seed * 1000 + worker_id)
+        client = app.test_client()
+        samples = []
+        for _ in range(count):
+            method, url, kwargs, session_values = scenario_requests(name, ctx, rnd)
+            with client.session_transaction() as sess:
+                sess.clear()
+                sess.update(session_values)
+            _queries.count = 0
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            elapsed = time.perf_counter() - start
+            samples.append((elapsed, _queries.count, response.status_code))
+        return samples
+
+    shares = [args.requests // args.concurrency + (i < args.requests % args.concurrency)
+              for i in range(args.concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(worker, range(args.concurrency), shares))
+    wall = time.perf_counter() - start
+
+    samples = [s for batch in results for s in batch]
+    latencies = sorted(s[0] * 1000 for s in samples)
+    errors = sum(1 for s in samples if s[2] >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries_per_request': round(statistics.mean(s[1] for s in samples), 2) if samples else 0.0,
+    }
+
+
+def measure_startup(runs):
+    """Wall time of `runs` fresh interpreters that import the app and build it."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'from app import create_app; create_app()'], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {'runs': runs, 'p50_ms': round(percentile(times, 50), 1), 'max_ms': round(times[-1], 1)}
+
+
+def oversell_check(app, db, ctx, args, stock=20):
+    """Race 2 x stock one-unit orders for one product; none may oversell."""
+    from models import Product
+    product_id = ctx['product_ids'][0]
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        product.stock, product.is_active = stock, True
+        name, price = product.name, product.price
+        db.session.commit()
+    from catalog import invalidate_catalog
+    invalidate_catalog()
+
+    def attempt(i):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1 + i % ctx['users']
+        response = client.post('/api/orders', json={
+            'customer_name': 'Race', 'phone': '9000000000', 'streetAddress': f'{1 + i % ctx["users"]} Main Road',
+            'city': 'Chennai', 'delivery_type': 'standard', 'payment_method': 'cod',
+            'items': [{'name': name, 'price': price, 'qty': 1}]})
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=max(2, args.concurrency)) as pool:
+        codes = list(pool.map(attempt, range(stock * 2)))
+    with app.app_context():
+        final = db.session.get(Product, product_id).stock
+    accepted = codes.count(200)
+    return {'stock': stock, 'attempts': len(codes), 'accepted': accepted,
+            'rejected_insufficient': codes.count(400), 'server_errors': sum(c >= 500 for c in codes),
+            'final_stock': final, 'ok': accepted <= stock and final == stock - accepted and final >= 0}
+
+
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of results versus baseline (may be {}), plus failed requests."""
+    problems = [f"{name}: {current['errors']} of {current['requests']} requests failed"
+                for name, current in results['scenarios'].items() if current['errors']]
+    if baseline and baseline.get('meta', {}).get('scale') != results['meta']['scale']:
+        print('warning: baseline was run at a different scale; numbers are not comparable')
+    for name, current in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+        if current['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            problems.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current['queries_per_request'] > before['queries_per_request'] + 0.5:
+            problems.append(f"{name}: queries/request {before['queries_per_request']} -> {current['queries_per_request']}")
+    current, before = results.get('startup'), baseline.get('startup')
+    if current and before and current['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+        problems.append(f"startup: p50 {before['p50_ms']} -> {current['p50_ms']} ms")
+    return problems
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    args = parse_args()
+    args.concurrency = max(1, args.concurrency)
+    workdir = tempfile.mkdtemp(prefix='pharmacy-bench-')
+    # through the environment, so the start-up runs use the same database
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from sqlalchemy import event, func, select
+    from app import create_app
+    from models import db, Admin, Product, User
+
+    app = create_app({'UPLOAD_FOLDER': os.path.join(workdir, 'uploads')})
+    rnd = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        dialect = db.engine.dialect.name
+        if not args.skip_seed:
+            start = time.perf_counter()
+            seed(db, args, rnd)
+            print(f'seeded in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _count_query)
+        ctx = {
+            'users': db.session.execute(select(func.max(User.id))).scalar() or 0,
+            'admin_id': db.session.execute(select(func.min(Admin.id))).scalar(),
+            'repeat_scan': b'%PDF-1.4\n' + random.Random(args.seed).randbytes(64 * 1024),
+        }
+        rows = db.session.execute(select(Product.id, Product.name, Product.price)
+                                  .where(Product.is_active.is_(True)).order_by(Product.id).limit(1000)).all()
+        ctx['products'] = [(r.name, r.price) for r in rows[1:]]  # the first one is kept for the oversell check
+        ctx['product_ids'] = [r.id for r in rows]
+    if not ctx['users'] or ctx['admin_id'] is None or len(rows) < 2:
+        sys.exit('database has no users, admin or products; run without --skip-seed')
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': dialect,
+            'python': platform.python_version(),
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'scale': {'users': args.users, 'products': args.products, 'orders': args.orders,
+                      'items_per_order': args.items_per_order, 'seeded': not args.skip_seed},
+        },
+        'scenarios': {},
+    }
+    print(f"{'scenario':<16} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'errors':>6}")
+    for name in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+        stats = run_scenario(app, name, ctx, args)
+        results['scenarios'][name] = stats
+        print(f"{name:<16} {stats['throughput_rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+              f"{stats['p99_ms']:>8} {stats['queries_per_request']:>6} {stats['errors']:>6}")
+
+    if args.startup_runs > 0:
+        results['startup'] = measure_startup(args.startup_runs)
+        print('startup:', results['startup'])
+
+    results['oversell_check'] = oversell_check(app, db, ctx, args)
+    print('oversell check:', 'ok' if results['oversell_check']['ok'] else 'FAILED', results['oversell_check'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    failed = not results['oversell_check']['ok']
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    # timings of error responses measure nothing, so a scenario with errors fails the run too
+    problems = compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print('REGRESSION', problem)
+    failed = failed or bool(problems)
+    return 1 if failed else 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _queries.count = getattr(_queries, 'count', 0) + 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Content-addressed, deduplicated storage for prescription files.
+
+Files live under UPLOAD_FOLDER/blobs/<aa>/<bb>/<sha256>.<ext>, keyed by
+the SHA-256 of the bytes that were uploaded, so a user re-uploading the
+same scan stores nothing new. Each blob has a row in prescription_blobs
+with a reference count: every prescription (or archived prescription)
+pointing at it holds one reference. release_blob() drops a reference and
+collect_blob_garbage() removes blobs nobody references any more.
+
+Run:
+    python blobstore.py --migrate   # one-off: move files uploaded before the blob store
+    python blobstore.py --gc        # delete blobs with no references left
+"""
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Prescription, PrescriptionBlob
+from uploads import normalised_path, thumbnail_path, _file_sha256
+
+_blobs = PrescriptionBlob.__table__
+
+
+def blob_relpath(sha256, ext):
+    """Sharded path of a blob relative to the upload folder."""
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}'
+
+
+def _addref(sha256):
+    result = db.session.execute(
+        update(_blobs).where(_blobs.c.sha256 == sha256).values(ref_count=_blobs.c.ref_count + 1)
+    )
+    if not result.rowcount:
+        return None
+    return db.session.execute(select(_blobs.c.path).where(_blobs.c.sha256 == sha256)).scalar_one()
+
+
+def store_blob(source_path, sha256, ext, size):
+    """Take one reference on the blob with these contents, storing it if new.
+
+    The file at source_path is hard-linked into place and left for the
+    caller to remove. Runs inside the caller's transaction. Returns
+    (relative path, created) where created is False on a dedup hit.
+    """
+    path = _addref(sha256)
+    if path is not None:
+        return path, False
+
+    relpath = blob_relpath(sha256, ext)
+    full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relpath)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    try:
+        os.link(source_path, full_path)
+    except FileExistsError:
+        pass  # same name means same bytes (left over from an earlier failed request)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(_blobs).values(
+                sha256=sha256, path=relpath, size=size, ref_count=1, created_at=datetime.utcnow()))
+    except IntegrityError:
+        # a concurrent upload of the same bytes inserted the row first
+        return _addref(sha256), False
+    return relpath, True
+
+
+def release_blob(sha256):
+    """Drop one reference (inside the caller's transaction)."""
+    if sha256:
+        db.session.execute(
+            update(_blobs).where(_blobs.c.sha256 == sha256).values(ref_count=_blobs.c.ref_count - 1)
+        )
+
+
+def collect_blob_garbage(limit=500):
+    """Delete unreferenced blobs and their files; returns how many went.
+
+    Each blob is locked, re-checked and removed in its own transaction, so
+    an upload of the same bytes racing the sweep either keeps the blob
+    alive or waits and stores it again.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    candidates = db.session.execute(
+        select(_blobs.c.sha256).where(_blobs.c.ref_count <= 0).limit(limit)
+    ).scalars().all()
+    db.session.commit()
+    removed = 0
+    for sha256 in candidates:
+        try:
+            row = db.session.execute(
+                select(_blobs.c.path).where(_blobs.c.sha256 == sha256, _blobs.c.ref_count <= 0)
+                .with_for_update()
+            ).first()
+            if row is None:
+                db.session.rollback()
+                continue
+            name = os.path.basename(row.path)
+            for path in (os.path.join(upload_folder, row.path), normalised_path(upload_folder, name),
+                         thumbnail_path(upload_folder, name)):
+                if os.path.exists(path):
+                    os.remove(path)
+            db.session.execute(delete(_blobs).where(_blobs.c.sha256 == sha256))
+            db.session.commit()
+            removed += 1
+        except Exception as e:
+            db.session.rollback()
+            print('Could not collect blob', sha256, str(e))
+    return removed
+
+
+def migrate_existing_prescriptions(batch_size=200):
+    """Move files of pre-blob-store prescriptions into the blob store."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    moved = 0
+    last_id = 0
+    while True:
+        batch = (Prescription.query
+                 .filter(Prescription.blob_sha256.is_(None), Prescription.id > last_id)
+                 .order_by(Prescription.id).limit(batch_size).all())
+        if not batch:
+            break
+        migrated = []
+        for prescription in batch:
+            last_id = prescription.id
+            old_path = os.path.join(upload_folder, prescription.filename)
+            if not os.path.exists(old_path):
+                print('Missing file for prescription', prescription.id, prescription.filename)
+                continue
+            sha256 = _file_sha256(old_path)
+            ext = prescription.filename.rsplit('.', 1)[-1].lower()
+            relpath, _ = store_blob(old_path, sha256, ext, os.path.getsize(old_path))
+            prescription.filename = relpath
+            prescription.blob_sha256 = sha256
+            migrated.append(old_path)
+        db.session.commit()
+        # only unlink the old names once the new paths are committed
+        for old_path in migrated:
+            os.remove(old_path)
+        moved += len(migrated)
+    return moved
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Prescription blob store maintenance')
+    parser.add_argument('--migrate', action='store_true', help='move legacy uploads into the blob store')
+    parser.add_argument('--gc', action='store_true', help='delete blobs with no references')
+    args = parser.parse_args()
+    with app.app_context():
+        if args.migrate:
+            print(f'Migrated {migrate_existing_prescriptions()} prescriptions')
+        if args.gc:
+            print(f'Removed {collect_blob_garbage()} unreferenced blobs')
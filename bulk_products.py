@@ -0,0 +1,272 @@
+"""Bulk product import/export keyed by SKU.
+
+Import streams a CSV or JSONL file and upserts it in batches: one
+multi-row INSERT ... ON DUPLICATE KEY UPDATE per batch on MySQL (ON
+CONFLICT DO UPDATE on SQLite). Only the columns present in a row are
+written, so a file with just sku,price,stock updates prices and stock
+without touching names or images. Rows whose name already belongs to a
+product with another SKU are reported before the upsert, because MySQL
+would otherwise treat the name match as the row to update. A batch that
+still fails is retried row by row so every bad row is reported with its
+line number and the rest still load. Export streams the table
+with a server-side cursor, so memory stays flat.
+
+Running servers pick the changes up when their catalog and search caches
+expire (see catalog.py and search.py).
+
+Run:
+    python bulk_products.py import distributor.csv [--batch-size 1000]
+    python bulk_products.py export products.jsonl   # '-' writes CSV to stdout
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Product
+
+FIELDS = ['sku', 'name', 'category', 'price', 'stock', 'is_active', 'description', 'image']
+BATCH_SIZE = 1000
+EXPORT_CHUNK = 2000
+
+_products = Product.__table__
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'off'}
+
+
+def _format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(path, fmt=None):
+    """Yield (line number, raw dict) from a CSV or JSONL file, lazily.
+
+    A JSONL line that is not an object yields a ValueError instead of a
+    dict so the caller can report it and carry on.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if _format(path, fmt) == 'jsonl':
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError('expected a JSON object')
+                except ValueError as e:
+                    yield lineno, ValueError(str(e))
+                    continue
+                yield lineno, row
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def _int(value, field):
+    try:
+        # accept decimals like '12.50' but store whole units, as the admin form does
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be a number, got {value!r}')
+
+
+def clean_row(raw):
+    """Validate one input row and return the column values to write.
+
+    sku, name and price are required. Blank optional fields are left out
+    (so they keep their current value on update, or the column default
+    on insert). When only stock is
+    given, is_active follows it, matching how checkout deactivates
+    sold-out products.
+    """
+    values = {}
+    for field in FIELDS:
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        values[field] = value
+    for field in ('sku', 'name', 'price'):
+        if field not in values:
+            raise ValueError(f'missing {field}')
+    values['sku'] = str(values['sku'])
+    if 'category' in values:
+        values['category'] = str(values['category']).lower()
+    values['price'] = _int(values['price'], 'price')
+    if 'stock' in values:
+        values['stock'] = _int(values['stock'], 'stock')
+        if values['stock'] < 0:
+            raise ValueError('stock cannot be negative')
+    if 'is_active' in values:
+        flag = str(values['is_active']).lower()
+        if flag not in _TRUE | _FALSE:
+            raise ValueError(f'is_active must be true/false, got {values["is_active"]!r}')
+        values['is_active'] = flag in _TRUE
+    elif 'stock' in values:
+        values['is_active'] = values['stock'] > 0
+    if values['price'] < 0:
+        raise ValueError('price cannot be negative')
+    return values
+
+
+def _upsert_statement(columns):
+    """INSERT ... upsert on sku for this dialect, updating `columns`."""
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(_products)
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in columns if c != 'sku'})
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(_products)
+        return stmt.on_conflict_do_update(
+            index_elements=['sku'], set_={c: stmt.excluded[c] for c in columns if c != 'sku'})
+    raise RuntimeError(f'bulk upsert is not supported on {dialect}')
+
+
+def _name_collisions(rows):
+    """Split off rows whose name belongs to a product with another sku.
+
+    ON DUPLICATE KEY UPDATE fires on the unique name index as well, so on
+    MySQL such a row would overwrite that product instead of failing.
+    Within the batch the first row to use a name keeps it. Returns (rows
+    to write, errors).
+    """
+    # MySQL's default collation compares names and skus case-insensitively
+    key = str.lower if db.engine.dialect.name == 'mysql' else str
+    names = {values['name'] for _, values in rows}
+    owners = {key(name): sku for name, sku in db.session.execute(
+        select(_products.c.name, _products.c.sku).where(_products.c.name.in_(names)))}
+    kept, errors = [], []
+    for lineno, values in rows:
+        owner = owners.setdefault(key(values['name']), values['sku'])
+        if owner is None:
+            errors.append((lineno, f'name {values["name"]!r} belongs to a product without a sku'))
+        elif key(owner) != key(values['sku']):
+            errors.append((lineno, f'name {values["name"]!r} belongs to sku {owner}'))
+        else:
+            kept.append((lineno, values))
+    return kept, errors
+
+
+def upsert_products(rows):
+    """Upsert cleaned rows in one statement per column set; commits.
+
+    rows is a list of (line number, values). Returns a list of
+    (line number, error message) for rows that could not be written.
+    """
+    rows, errors = _name_collisions(rows)
+    # executemany needs the same keys in every row; CSV rows almost always share one set
+    groups = {}
+    for lineno, values in rows:
+        groups.setdefault(tuple(sorted(values)), []).append((lineno, values))
+    for columns, group in groups.items():
+        stmt = _upsert_statement(columns)
+        try:
+            db.session.execute(stmt, [values for _, values in group])
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            # find the offending rows one at a time and keep the good ones
+            for lineno, values in group:
+                try:
+                    db.session.execute(stmt, [values])
+                    db.session.commit()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    errors.append((lineno, str(getattr(e, 'orig', e)).splitlines()[0]))
+    return sorted(errors)
+
+
+def import_products(path, fmt=None, batch_size=BATCH_SIZE):
+    """Stream a catalog file into products; returns (written, failed)."""
+    start = time.perf_counter()
+    written = failed = 0
+    batch = {}  # sku -> (line number, values); a later line for the same sku wins
+
+    def flush():
+        nonlocal written, failed
+        errors = upsert_products(list(batch.values()))
+        for lineno, message in errors:
+            print(f'line {lineno}: {message}', file=sys.stderr)
+        written += len(batch) - len(errors)
+        failed += len(errors)
+        batch.clear()
+        rate = written / max(time.perf_counter() - start, 1e-6)
+        print(f'{written} products written, {failed} failed ({rate:.0f} rows/s)', file=sys.stderr)
+
+    for lineno, raw in read_rows(path, fmt):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            values = clean_row(raw)
+        except ValueError as e:
+            print(f'line {lineno}: {e}', file=sys.stderr)
+            failed += 1
+            continue
+        batch[values['sku']] = (lineno, values)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return written, failed
+
+
+def export_products(out, fmt='csv'):
+    """Write every product to the open text file `out`; returns the count."""
+    columns = [_products.c[field] for field in FIELDS]
+    result = db.session.execute(
+        select(*columns).order_by(_products.c.id).execution_options(yield_per=EXPORT_CHUNK))
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(FIELDS)
+    count = 0
+    for row in result:
+        if writer:
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk product import/export keyed by SKU')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='upsert products from a CSV or JSONL file')
+    imp.add_argument('path')
+    imp.add_argument('--format', choices=['csv', 'jsonl'])
+    imp.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    exp = sub.add_parser('export', help="write all products to a CSV or JSONL file ('-' for stdout)")
+    exp.add_argument('path')
+    exp.add_argument('--format', choices=['csv', 'jsonl'])
+    args = parser.parse_args()
+
+    from app import script_app
+    with script_app().app_context():
+        if args.command == 'import':
+            written, failed = import_products(args.path, args.format, max(1, args.batch_size))
+            print(f'Imported {written} products ({failed} rows failed)')
+            return 1 if failed else 0
+        if args.path == '-':
+            count = export_products(sys.stdout, args.format or 'csv')
+        else:
+            with open(args.path, 'w', newline='', encoding='utf-8') as out:
+                count = export_products(out, _format(args.path, args.format))
+        print(f'Exported {count} products', file=sys.stderr)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Server-side carts keyed by product id.
+
+The browser sends small deltas ("+2 of product 7", "set product 3 to 1")
+to /api/cart as the shopper goes; each change is checked against the
+catalog (active, enough stock) when it is made. Prices are never taken
+from the client: a cart is priced from the products table whenever it
+is read, and checkout_lines() gives create_order the validated lines in
+one query, so checkout no longer resolves names or trusts posted prices.
+
+Carts untouched for CART_TTL_DAYS are removed by purge_stale_carts():
+    python cart.py --purge
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_, select
+
+from models import db, CartItem, Product
+
+CART_TTL_DAYS = 30
+MAX_LINE_QTY = 99
+MAX_CART_LINES = 100
+
+
+class CartError(ValueError):
+    """A cart change or checkout that cannot be accepted; the message is for the shopper."""
+
+
+def _lines(user_id):
+    return db.session.execute(
+        select(CartItem.product_id, CartItem.qty, Product.name, Product.price, Product.stock,
+               Product.is_active, Product.image)
+        .join(Product, Product.id == CartItem.product_id)
+        .where(CartItem.user_id == user_id)
+        .order_by(CartItem.updated_at, CartItem.product_id)
+    ).all()
+
+
+def get_cart(user_id):
+    """The cart as JSON-ready data, priced from the catalog."""
+    items = []
+    for line in _lines(user_id):
+        items.append({
+            'product_id': line.product_id, 'name': line.name, 'price': line.price,
+            'qty': line.qty, 'line_total': line.qty * line.price, 'image': line.image,
+            'available': bool(line.is_active) and line.stock >= line.qty,
+            'stock': line.stock,
+        })
+    return {'items': items,
+            'item_count': sum(i['qty'] for i in items),
+            'subtotal': sum(i['line_total'] for i in items)}
+
+
+def apply_changes(user_id, changes):
+    """Apply a list of {'product_id' (or 'name'), 'delta' or 'qty'} changes.
+
+    A resulting quantity of 0 or less removes the line. Raises CartError
+    without changing anything if any change is invalid; the caller commits.
+    """
+    if not isinstance(changes, list) or not changes:
+        raise CartError('No cart changes given')
+    ids, names = set(), set()
+    for change in changes:
+        if not isinstance(change, dict) or ('delta' in change) == ('qty' in change):
+            raise CartError('Each change needs a product and either delta or qty')
+        if change.get('product_id') is not None:
+            ids.add(_as_int(change['product_id'], 'product_id'))
+        elif change.get('name'):
+            # carts saved in the browser before server carts only know names
+            names.add(str(change['name']))
+        else:
+            raise CartError('Each change needs a product_id')
+    products = db.session.execute(
+        select(Product.id, Product.name, Product.stock, Product.is_active)
+        .where(or_(Product.id.in_(ids), Product.name.in_(names)))
+    ).all()
+    by_id = {p.id: p for p in products}
+    by_name = {p.name: p for p in products}
+    current = {item.product_id: item for item in CartItem.query.filter_by(user_id=user_id)}
+
+    wanted = {pid: item.qty for pid, item in current.items()}
+    for change in changes:
+        if change.get('product_id') is not None:
+            product = by_id.get(_as_int(change['product_id'], 'product_id'))
+        else:
+            product = by_name.get(str(change['name']))
+        if product is None:
+            raise CartError('Product not found')
+        if 'qty' in change:
+            wanted[product.id] = _as_int(change['qty'], 'qty')
+        else:
+            wanted[product.id] = wanted.get(product.id, 0) + _as_int(change['delta'], 'delta')
+
+    now = datetime.utcnow()
+    changed = {pid for pid in wanted if wanted[pid] != (current[pid].qty if pid in current else 0)}
+    for pid in changed:
+        qty = wanted[pid]
+        if qty <= 0:
+            if pid in current:
+                db.session.delete(current[pid])
+            continue
+        product = by_id[pid]
+        if not product.is_active:
+            raise CartError(f'{product.name} is not available')
+        if qty > MAX_LINE_QTY:
+            raise CartError(f'At most {MAX_LINE_QTY} of {product.name} per order')
+        if qty > product.stock:
+            raise CartError(f'Only {product.stock} of {product.name} left')
+        if pid in current:
+            current[pid].qty = qty
+            current[pid].updated_at = now
+        else:
+            db.session.add(CartItem(user_id=user_id, product_id=pid, qty=qty, updated_at=now))
+    if sum(1 for q in wanted.values() if q > 0) > MAX_CART_LINES:
+        raise CartError(f'A cart can hold at most {MAX_CART_LINES} different products')
+
+
+def _as_int(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CartError(f'{field} must be a whole number')
+
+
+def clear_cart(user_id):
+    db.session.execute(delete(CartItem).where(CartItem.user_id == user_id))
+
+
+def checkout_lines(user_id):
+    """Validated lines for create_order: product_id, name, qty and catalog price.
+
+    Stock is only checked loosely here; reserve_stock() makes the final,
+    atomic decision.
+    """
+    lines = _lines(user_id)
+    if not lines:
+        raise CartError('Cart is empty')
+    for line in lines:
+        if not line.is_active:
+            raise CartError(f'{line.name} is no longer available. Please remove it from your cart.')
+    return lines
+
+
+def purge_stale_carts(days=CART_TTL_DAYS):
+    """Delete cart lines not touched for `days`; returns how many."""
+    result = db.session.execute(
+        delete(CartItem).where(CartItem.updated_at < datetime.utcnow() - timedelta(days=days)))
+    db.session.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Server-side cart maintenance')
+    parser.add_argument('--purge', action='store_true', help='delete abandoned carts')
+    parser.add_argument('--days', type=int, default=CART_TTL_DAYS)
+    args = parser.parse_args()
+    if not args.purge:
+        parser.error('nothing to do; pass --purge')
+    with app.app_context():
+        print(f'{purge_stale_carts(args.days)} cart lines removed')
@@ -0,0 +1,131 @@
+"""In-process cache of the shopper-facing product catalog.
+
+The whole active catalog is loaded once and served from memory; filtering,
+search (see search.py) and paging run against the cached list. Admin
+product writes call invalidate_catalog(), checkout applies its stock
+changes in place, and a TTL bounds how stale another worker process can
+get. Each change bumps a version that is part of the ETag, so unchanged
+pages answer 304.
+"""
+import threading
+import time
+import uuid
+
+from models import Product
+from search import search_products, unindex_product
+
+CATALOG_CACHE_TTL = 300  # seconds
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 100
+
+_lock = threading.Lock()
+# token keeps ETags from two worker processes from ever colliding
+_state = {'products': None, 'expires': 0.0, 'version': 0, 'token': uuid.uuid4().hex[:8]}
+
+
+def _load():
+    products = Product.query.filter(Product.is_active.is_(True)).order_by(Product.name).all()
+    return {p.id: p.to_dict() for p in products}
+
+
+def _snapshot():
+    """Return (version, {id: product dict}) ordered by name, loading if needed.
+
+    version is None when an invalidation raced the reload; that result is
+    served once but never given an ETag.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _state['products'] is not None and now < _state['expires']:
+            return f"{_state['token']}-{_state['version']}", _state['products']
+        version = _state['version']
+    products = _load()
+    with _lock:
+        if _state['version'] != version:
+            return None, products
+        _state['products'] = products
+        _state['expires'] = now + CATALOG_CACHE_TTL
+        _state['version'] += 1
+        return f"{_state['token']}-{_state['version']}", products
+
+
+def get_catalog_products():
+    """All active products (as to_dict() dicts) sorted by name."""
+    _, products = _snapshot()
+    return list(products.values())
+
+
+def search_catalog(q, limit=None):
+    """Best matches for q as catalog dicts, for typeahead."""
+    _, by_id = _snapshot()
+    return [by_id[pid] for pid in search_products(q, limit) if pid in by_id]
+
+
+def query_catalog(category=None, q=None, page=1, per_page=CATALOG_PAGE_SIZE):
+    """Filter the cached catalog and return one page of it.
+
+    The result carries the catalog 'version' it was computed from, which
+    the API uses to build its ETag.
+    """
+    version, by_id = _snapshot()
+    if q and q.strip():
+        # ranked by the search index; ids no longer in the catalog are skipped
+        products = [by_id[pid] for pid in search_products(q, limit=None) if pid in by_id]
+    else:
+        products = list(by_id.values())
+    if category and category != 'all':
+        category = category.lower()
+        products = [p for p in products if (p['category'] or '').lower() == category]
+
+    page = max(1, page)
+    per_page = min(max(1, per_page), CATALOG_MAX_PAGE_SIZE)
+    start = (page - 1) * per_page
+    return {
+        'version': version,
+        'products': products[start:start + per_page],
+        'total': len(products),
+        'page': page,
+        'per_page': per_page,
+    }
+
+
+def _drop():
+    # caller holds _lock
+    _state['products'] = None
+    _state['expires'] = 0.0
+    _state['version'] += 1
+
+
+def invalidate_catalog():
+    """Drop the cached catalog; the next read reloads it from the database."""
+    with _lock:
+        _drop()
+
+
+def apply_stock_changes(quantities):
+    """Mirror a committed checkout ({product_id: qty sold}) into the cache.
+
+    Saves reloading the whole catalog on every order. Products that sell
+    out drop out of the listing, as they are deactivated in the database.
+    A product the cache has never seen (e.g. one checkout just created)
+    forces a full reload instead.
+    """
+    with _lock:
+        products = _state['products']
+        if products is None:
+            return
+        if any(product_id not in products for product_id in quantities):
+            _drop()
+            return
+        # copy-on-write so readers holding the old dict never see a half update
+        products = dict(products)
+        for product_id, qty in quantities.items():
+            product = products[product_id]
+            stock = max(0, product['stock'] - qty)
+            if stock == 0:
+                del products[product_id]
+                unindex_product(product_id)
+            else:
+                products[product_id] = dict(product, stock=stock)
+        _state['products'] = products
+        _state['version'] += 1
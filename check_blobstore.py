@@ -0,0 +1,88 @@
+"""Check that removing prescriptions releases their blob references.
+
+Builds a scratch SQLite database and upload folder, files the same bytes
+as two prescriptions (one blob, two references), archives both through
+retention, then purges the archived rows one at a time: the blob must
+survive garbage collection while a reference is left and go with the
+last one. Exits 1 on any failure. Meant for CI:
+
+    python check_blobstore.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if __name__ == '__main__':
+    folder = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(folder, "check.db")}'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    from flask_migrate import upgrade
+
+    from app import script_app
+    from archive import run_retention
+    from blobstore import collect_blob_garbage, store_blob
+    from models import db, Prescription, PrescriptionArchive, PrescriptionBlob, User
+    from uploads import _file_sha256
+
+    failures = []
+
+    def check(ok, message):
+        if not ok:
+            failures.append(message)
+
+    try:
+        upload_folder = os.path.join(folder, 'uploads')
+        os.makedirs(upload_folder)
+        with script_app({'UPLOAD_FOLDER': upload_folder}, migrations=True).app_context():
+            upgrade()
+            user = User(name='Check', username='check-blobstore')
+            db.session.add(user)
+            db.session.flush()
+
+            source = os.path.join(folder, 'scan.png')
+            with open(source, 'wb') as f:
+                f.write(b'the same scan, uploaded twice')
+            sha256 = _file_sha256(source)
+            long_ago = datetime.utcnow() - timedelta(days=30)
+            for _ in range(2):
+                relpath, _ = store_blob(source, sha256, 'png', os.path.getsize(source))
+                db.session.add(Prescription(user_id=user.id, filename=relpath, blob_sha256=sha256,
+                                            status='completed', uploaded_at=long_ago))
+            db.session.commit()
+            blob_file = os.path.join(upload_folder, relpath)
+
+            def ref_count():
+                db.session.expire_all()
+                return db.session.get(PrescriptionBlob, sha256).ref_count
+
+            check(ref_count() == 2, f'two uploads should hold 2 references, not {ref_count()}')
+            _, archived, _, _ = run_retention(order_days=0, prescription_days=1)
+            check(archived == 2, f'expected 2 prescriptions archived, got {archived}')
+            check(ref_count() == 2, f'archiving should keep both references, not {ref_count()}')
+
+            first = PrescriptionArchive.query.order_by(PrescriptionArchive.id).first()
+            first.archived_at = long_ago
+            db.session.commit()
+            _, _, purged, _ = run_retention(order_days=0, prescription_days=0, purge_days=1)
+            check(purged == 1, f'expected 1 archived prescription purged, got {purged}')
+            check(ref_count() == 1, f'purging one should leave 1 reference, not {ref_count()}')
+            collect_blob_garbage()
+            check(os.path.exists(blob_file), 'a blob still referenced was garbage collected')
+
+            PrescriptionArchive.query.update({'archived_at': long_ago})
+            db.session.commit()
+            run_retention(order_days=0, prescription_days=0, purge_days=1)
+            check(ref_count() == 0, f'purging both should leave no references, not {ref_count()}')
+            check(collect_blob_garbage() == 1, 'the unreferenced blob was not collected')
+            check(not os.path.exists(blob_file), 'the unreferenced blob file is still on disk')
+    finally:
+        shutil.rmtree(folder)
+    if failures:
+        print('Blob references are not released:')
+        for failure in failures:
+            print('  ', failure)
+        sys.exit(1)
+    print('Removed prescriptions release their blobs.')
@@ -0,0 +1,89 @@
+"""Check that concurrent checkouts cannot oversell the last units.
+
+Builds a scratch SQLite database with two products a few units each and
+starts many threads at once, each reserving one unit of both through
+reserve_stock() and committing, like checkout does. Exactly as many
+checkouts as there were units must succeed, the rest must get
+InsufficientStock, and the products must end at zero stock and
+inactive. Exits 1 otherwise. Runs in seconds, without benchmark.py:
+
+    python check_stock_race.py [--threads 20] [--stock 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Race concurrent checkouts for the last units')
+    parser.add_argument('--threads', type=int, default=20, help='concurrent checkouts')
+    parser.add_argument('--stock', type=int, default=5, help='units of each product')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    from flask_migrate import upgrade
+
+    from app import script_app
+    from models import db, Product
+    from stock import InsufficientStock, reserve_stock
+
+    app = script_app(migrations=True)
+    start = threading.Barrier(args.threads)
+    outcomes = []
+
+    def checkout(quantities):
+        with app.app_context():
+            start.wait()
+            try:
+                reserve_stock(quantities)
+                db.session.commit()
+                outcomes.append('sold')
+            except InsufficientStock:
+                outcomes.append('out of stock')
+            except Exception as e:
+                db.session.rollback()
+                outcomes.append(f'error: {e}')
+            finally:
+                db.session.remove()
+
+    try:
+        with app.app_context():
+            upgrade()
+            products = [Product(name=f'Race check {i}', price=100, category='other', stock=args.stock,
+                                is_active=True) for i in range(2)]
+            db.session.add_all(products)
+            db.session.commit()
+            # alternate the cart order so the id-ordered locking is exercised too
+            carts = [{products[0].id: 1, products[1].id: 1},
+                     {products[1].id: 1, products[0].id: 1}]
+
+        threads = [threading.Thread(target=checkout, args=(carts[i % 2],)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            final = [(p.stock, p.is_active) for p in Product.query.filter(Product.name.like('Race check %'))]
+    finally:
+        os.unlink(path)
+
+    sold = outcomes.count('sold')
+    expected = min(args.stock, args.threads)
+    failures = [o for o in outcomes if o.startswith('error')]
+    if sold != expected:
+        failures.append(f'{sold} checkouts succeeded for {expected} units')
+    left = args.stock - expected
+    if any(stock != left or is_active != (left > 0) for stock, is_active in final):
+        failures.append(f'products ended as (stock, active) {final}, expected {left} left each')
+    if failures:
+        print('Concurrent checkouts oversold or failed:')
+        for failure in failures:
+            print('  ', failure)
+        sys.exit(1)
+    print(f'{args.threads} concurrent checkouts sold exactly {sold} units.')
@@ -0,0 +1,57 @@
+"""Counters shown on the admin dashboard.
+
+All counters are read with one aggregate query and kept in a small
+in-process cache. Endpoints that change them call
+invalidate_dashboard_counts() after committing; the TTL bounds how stale
+another worker process can be.
+"""
+import threading
+import time
+
+from sqlalchemy import func, select
+
+from models import db, Order, OrderArchive, Prescription, PrescriptionArchive, Product
+
+DASHBOARD_CACHE_TTL = 30  # seconds
+
+_lock = threading.Lock()
+_cached = {'counts': None, 'expires': 0.0, 'generation': 0}
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+def load_dashboard_counts():
+    """Fetch every dashboard counter in a single round trip."""
+    stmt = select(
+        (_count(Prescription) + _count(PrescriptionArchive)).label('total_prescriptions'),
+        _count(Prescription, Prescription.status == 'pending').label('pending_prescriptions'),
+        (_count(Order) + _count(OrderArchive)).label('total_orders'),
+        _count(Product).label('total_products'),
+    )
+    return dict(db.session.execute(stmt).one()._mapping)
+
+
+def get_dashboard_counts():
+    """Return the cached counters, reloading them once the TTL has passed."""
+    now = time.monotonic()
+    with _lock:
+        if _cached['counts'] is not None and now < _cached['expires']:
+            return dict(_cached['counts'])
+        generation = _cached['generation']
+    counts = load_dashboard_counts()
+    with _lock:
+        # don't store a result that an invalidation raced past
+        if _cached['generation'] == generation:
+            _cached['counts'] = counts
+            _cached['expires'] = now + DASHBOARD_CACHE_TTL
+    return dict(counts)
+
+
+def invalidate_dashboard_counts():
+    """Drop the cached counters so the next dashboard view reloads them."""
+    with _lock:
+        _cached['counts'] = None
+        _cached['expires'] = 0.0
+        _cached['generation'] += 1
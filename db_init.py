@@ -1,12 +1,16 @@
-"""Initialize the SQLite database and optionally seed products.
+"""Initialize the database and optionally seed products.
+
+Applies every pending migration (same as `flask db upgrade`), then
+seeds. An existing database created before migrations must be stamped
+first with `python fix_migrations.py`.
 
 Run:
     python db_init.py
 """
-from app import app
+from app import script_app
 from models import db, Product
 from models import Address, User
-from sqlalchemy import text
+from flask_migrate import upgrade
 
 seed_products = [
     {'name':'Multivitamin Tablets','category':'nutrition','price':600,'description':'Daily multivitamin for overall health','image':'image/multivitamin.webp'},
@@ -42,64 +46,10 @@ seed_products = [
 ]
 
 
-def ensure_product_columns():
-    """Add sku, stock, is_active columns to products table if they don't exist.
-
-    This is a convenience for development. In production use Alembic/Flask-Migrate.
-    """
-    with app.app_context():
-        db_name = db.engine.url.database
-        checks = {
-            'sku': "ALTER TABLE products ADD COLUMN sku VARCHAR(100)",
-            'stock': "ALTER TABLE products ADD COLUMN stock INT DEFAULT 0",
-            'is_active': "ALTER TABLE products ADD COLUMN is_active TINYINT(1) DEFAULT 1",
-        }
-        for col, alter_sql in checks.items():
-            qry = text("SELECT COUNT(*) FROM information_schema.columns WHERE table_schema=:schema AND table_name='products' AND column_name=:col")
-            res = db.session.execute(qry, {'schema': db_name, 'col': col}).scalar()
-            if not res:
-                db.session.execute(text(alter_sql))
-                db.session.commit()
-
-
-def ensure_order_columns():
-    """Add delivery-related columns to orders table if they don't exist.
-
-    Convenience only - use migrations for production.
-    """
-    with app.app_context():
-        db_name = db.engine.url.database
-        checks = {
-            'address_id': "ALTER TABLE orders ADD COLUMN address_id INT",
-            'street': "ALTER TABLE orders ADD COLUMN street VARCHAR(300)",
-            'city': "ALTER TABLE orders ADD COLUMN city VARCHAR(100)",
-            'state': "ALTER TABLE orders ADD COLUMN state VARCHAR(100)",
-            'postal_code': "ALTER TABLE orders ADD COLUMN postal_code VARCHAR(20)",
-            'country': "ALTER TABLE orders ADD COLUMN country VARCHAR(100)",
-            'delivery_instructions': "ALTER TABLE orders ADD COLUMN delivery_instructions TEXT",
-            'scheduled_delivery': "ALTER TABLE orders ADD COLUMN scheduled_delivery DATETIME",
-            'delivery_fee': "ALTER TABLE orders ADD COLUMN delivery_fee INT DEFAULT 0",
-        }
-        for col, alter_sql in checks.items():
-            qry = text("SELECT COUNT(*) FROM information_schema.columns WHERE table_schema=:schema AND table_name='orders' AND column_name=:col")
-            res = db.session.execute(qry, {'schema': db_name, 'col': col}).scalar()
-            if not res:
-                db.session.execute(text(alter_sql))
-                db.session.commit()
-
-
 def init_db(seed=True):
-    with app.app_context():
-        db.create_all()
-        # ensure product and order columns exist for older schemas (adds columns if missing)
-        try:
-            ensure_product_columns()
-        except Exception as e:
-            print('ensure_product_columns failed:', e)
-        try:
-            ensure_order_columns()
-        except Exception as e:
-            print('ensure_order_columns failed:', e)
+    with script_app(migrations=True).app_context():
+        # bring the schema to the latest revision (migrations/); no-op when current
+        upgrade()
         if seed:
             # only seed if products table is empty
             if Product.query.first() is None:
@@ -124,30 +74,3 @@ def init_db(seed=True):
 
 if __name__ == '__main__':
     init_db(seed=True)
-
-
-def ensure_order_columns():
-    """Add delivery-related columns to orders table if they don't exist.
-
-    Convenience only - use migrations for production.
-    """
-    with app.app_context():
-        db_name = db.engine.url.database
-        checks = {
-            'address_id': "ALTER TABLE orders ADD COLUMN address_id INT",
-            'street': "ALTER TABLE orders ADD COLUMN street VARCHAR(300)",
-            'city': "ALTER TABLE orders ADD COLUMN city VARCHAR(100)",
-            'state': "ALTER TABLE orders ADD COLUMN state VARCHAR(100)",
-            'postal_code': "ALTER TABLE orders ADD COLUMN postal_code VARCHAR(20)",
-            'country': "ALTER TABLE orders ADD COLUMN country VARCHAR(100)",
-            'delivery_instructions': "ALTER TABLE orders ADD COLUMN delivery_instructions TEXT",
-            'scheduled_delivery': "ALTER TABLE orders ADD COLUMN scheduled_delivery DATETIME",
-            'delivery_fee': "ALTER TABLE orders ADD COLUMN delivery_fee INT DEFAULT 0",
-        }
-        for col, alter_sql in checks.items():
-            qry = text("SELECT COUNT(*) FROM information_schema.columns WHERE table_schema=:schema AND table_name='orders' AND column_name=:col")
-            res = db.session.execute(qry, {'schema': db_name, 'col': col}).scalar()
-            if not res:
-                db.session.execute(text(alter_sql))
-                db.session.commit()
-
@@ -1,30 +1,97 @@
-from app import app, db
-from sqlalchemy import text
-
-def fix_alembic_version():
-    with app.app_context():
-        try:
-            # First, check if alembic_version table exists
-            check_table = text("SHOW TABLES LIKE 'alembic_version'")
-            result = db.session.execute(check_table)
-            if not list(result):
-                # Create alembic_version table if it doesn't exist
-                create_table = text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
-                db.session.execute(create_table)
-                db.session.commit()
-                print("Created alembic_version table")
-
-            # Update to current revision
-            update_version = text("TRUNCATE TABLE alembic_version")
-            db.session.execute(update_version)
-            insert_version = text("INSERT INTO alembic_version (version_num) VALUES ('current_schema')")
-            db.session.execute(insert_version)
-            db.session.commit()
-            print("Updated alembic_version to current_schema")
-
-        except Exception as e:
-            print(f"Error: {e}")
-            db.session.rollback()
-
-if __name__ == "__main__":
-    fix_alembic_version()
\ No newline at end of file
+"""Adopt a database created before migrations existed.
+
+Older deployments built their schema with db.create_all() and startup
+probes that added columns one at a time, and this script used to stamp a
+made-up 'current_schema' revision. Now it inspects the database, finds
+the newest revision in migrations/ whose changes are all present, and
+stamps that one, so `flask db upgrade` applies exactly what is missing.
+
+Run once per existing database, then upgrade:
+    python fix_migrations.py [--dry-run]
+    flask db upgrade
+"""
+import argparse
+
+import sqlalchemy as sa
+from flask_migrate import stamp
+
+from app import script_app
+from models import db
+
+# revision -> what a database at that revision has; checked oldest first
+MARKERS = [
+    ('0001_baseline', [('table', 'users'), ('table', 'products'), ('table', 'orders'),
+                       ('table', 'order_items'), ('table', 'addresses'), ('table', 'prescriptions')]),
+    ('0002_legacy_fixups', [('column', 'users', 'password_hash'), ('column', 'products', 'stock'),
+                            ('column', 'products', 'is_active'), ('column', 'orders', 'address_id'),
+                            ('column', 'orders', 'delivery_fee'), ('column', 'order_items', 'product_name')]),
+    ('0003_product_lookup', [('column', 'products', 'sku'), ('index', 'products', 'ix_products_name')]),
+    ('0004_order_keyset_indexes', [('index', 'orders', 'ix_orders_created_at_id'),
+                                   ('index', 'orders', 'ix_orders_user_created_at_id')]),
+    ('0005_prescription_blobs', [('table', 'prescription_blobs'), ('column', 'prescriptions', 'blob_sha256')]),
+    ('0006_sales_rollups', [('table', 'daily_sales'), ('table', 'daily_product_sales'),
+                            ('table', 'daily_order_splits')]),
+    ('0007_jobs_and_user_email', [('table', 'jobs'), ('column', 'users', 'email')]),
+    ('0008_cart_and_idempotency', [('table', 'cart_items'), ('table', 'idempotency_keys')]),
+    ('0009_prescription_archive', [('column', 'orders', 'prescription_id'), ('table', 'prescription_archives')]),
+    ('0010_address_hash', [('column', 'addresses', 'addr_hash')]),
+    ('0011_prescription_queue', [('column', 'prescriptions', 'claimed_by'),
+                                 ('index', 'prescriptions', 'ix_prescriptions_status_uploaded_at_id')]),
+    ('0012_order_archives', [('table', 'order_archives'), ('table', 'order_item_archives'),
+                             ('column', 'prescription_archives', 'claimed_by')]),
+]
+
+
+def _present(inspector, check):
+    kind, table = check[0], check[1]
+    if not inspector.has_table(table):
+        return False
+    if kind == 'column':
+        return check[2] in {c['name'] for c in inspector.get_columns(table)}
+    if kind == 'index':
+        names = {i['name'] for i in inspector.get_indexes(table)}
+        names |= {u['name'] for u in inspector.get_unique_constraints(table)}
+        return check[2] in names
+    return True
+
+
+def detect_revision():
+    """Newest revision whose markers are all present (None for an empty database)."""
+    inspector = sa.inspect(db.engine)
+    current = None
+    for revision, checks in MARKERS:
+        missing = [c for c in checks if not _present(inspector, c)]
+        if missing:
+            ahead = [r for r, cs in MARKERS[MARKERS.index((revision, checks)) + 1:]
+                     if all(_present(inspector, c) for c in cs)]
+            if ahead:
+                print(f'Warning: {revision} is incomplete (missing {missing}) but {", ".join(ahead)} '
+                      f'look applied; fix the schema by hand before upgrading.')
+            break
+        current = revision
+    return current
+
+
+def adopt(dry_run=False):
+    inspector = sa.inspect(db.engine)
+    if inspector.has_table('alembic_version'):
+        with db.engine.connect() as conn:
+            versions = conn.execute(sa.text('SELECT version_num FROM alembic_version')).scalars().all()
+        if versions and versions != ['current_schema']:
+            print(f'Already managed by migrations (at {", ".join(versions)}); nothing to do.')
+            return
+    revision = detect_revision()
+    if revision is None:
+        print('No existing schema found; run `flask db upgrade` (or python db_init.py) to create it.')
+        return
+    print(f'Schema matches {revision}' + (' (dry run, not stamped)' if dry_run else '; stamping it.'))
+    if not dry_run:
+        stamp(revision=revision, purge=True)  # purge drops the old 'current_schema' row
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stamp a pre-migrations database at the revision it matches')
+    parser.add_argument('--dry-run', action='store_true', help='only report the detected revision')
+    args = parser.parse_args()
+    with script_app(migrations=True).app_context():
+        adopt(args.dry_run)
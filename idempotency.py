@@ -0,0 +1,96 @@
+"""Idempotency keys for order submission.
+
+The checkout page sends an Idempotency-Key header that stays the same
+for every retry of one submission. create_order inserts the key as the
+first write of its transaction and stores the response JSON in the same
+commit as the order, so:
+
+- a retry after success finds the key and gets the original response
+  back, without touching stock or creating another order;
+- a duplicate that arrives while the first is still running blocks on
+  the unique index until that transaction ends (no polling), then
+  replays its result;
+- if the first attempt fails, its rollback removes the key, and the
+  retry runs normally.
+
+Reusing a key with a different request body is rejected. Keys are kept
+for IDEMPOTENCY_KEY_TTL_HOURS:
+    python idempotency.py --purge
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+MAX_KEY_LENGTH = 100
+
+
+class IdempotencyError(ValueError):
+    """The key is malformed or was used for a different request."""
+
+
+def request_fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim_key(user_id, key, payload, attempts=3):
+    """Reserve key for this request at the start of its transaction.
+
+    Returns (record, None) when the caller should go ahead, or
+    (None, response_body) when an earlier request with this key already
+    succeeded. Must be the first write of the transaction: on a duplicate
+    the whole session is rolled back to read the committed result.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters')
+    fingerprint = request_fingerprint(payload)
+    for _ in range(attempts):
+        record = IdempotencyKey(user_id=user_id, key=key, request_hash=fingerprint)
+        db.session.add(record)
+        try:
+            # waits here while another request holds the same key
+            db.session.flush()
+            return record, None
+        except IntegrityError:
+            db.session.rollback()
+        existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        if existing is None:
+            continue  # the other attempt rolled back in between; try to claim again
+        if existing.request_hash != fingerprint:
+            raise IdempotencyError('Idempotency-Key was already used for a different order')
+        return None, json.loads(existing.response)
+    raise IdempotencyError('Could not reserve the Idempotency-Key; please retry')
+
+
+def save_response(record, order_id, body):
+    """Store the response to replay; commits together with the order."""
+    record.order_id = order_id
+    record.response = json.dumps(body)
+
+
+def purge_keys(hours=IDEMPOTENCY_KEY_TTL_HOURS):
+    """Delete keys older than `hours`; returns how many."""
+    result = db.session.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.created_at < datetime.utcnow() - timedelta(hours=hours)))
+    db.session.commit()
+    return result.rowcount
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Order idempotency key maintenance')
+    parser.add_argument('--purge', action='store_true', help='delete expired keys')
+    parser.add_argument('--hours', type=int, default=IDEMPOTENCY_KEY_TTL_HOURS)
+    args = parser.parse_args()
+    if not args.purge:
+        parser.error('nothing to do; pass --purge')
+    with app.app_context():
+        print(f'{purge_keys(args.hours)} idempotency keys removed')
@@ -0,0 +1,203 @@
+"""Low-stock alerts and reorder suggestions driven by sales velocity.
+
+Velocity is units sold per day over the last VELOCITY_WINDOW_DAYS, taken
+from the daily_product_sales rollups (analytics.py) rather than by
+scanning order_items. The window slides forward incrementally: closed
+days are read once, each check only re-reads today and yesterday (which
+late cancellations can still change), and days that leave the window
+are subtracted.
+
+From velocity and current stock the monitor predicts days to stockout
+and suggests an order quantity that covers REORDER_LEAD_DAYS +
+REORDER_COVER_DAYS of sales. Products that are out of stock (checkout
+deactivates them at 0) or will run out within LOW_STOCK_DAYS are sent
+as one digest per check through the configured notifier (notifier.py).
+A product is alerted again only when it gets worse or after
+ALERT_REPEAT_HOURS.
+
+The monitor runs on its own thread or process, never in a request:
+
+    python inventory.py            # check every INVENTORY_CHECK_SECONDS
+    python inventory.py --once     # one check, e.g. from cron
+    python inventory.py --report   # print the current numbers, send nothing
+
+or set INVENTORY_MONITOR=True to start it as a background thread of the
+app (one process only, or every worker will send alerts).
+"""
+import math
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import db, Product, DailyProductSales
+from notifier import make_notifier
+
+VELOCITY_WINDOW_DAYS = 14
+LOW_STOCK_DAYS = 7
+REORDER_LEAD_DAYS = 5
+REORDER_COVER_DAYS = 21
+INVENTORY_CHECK_SECONDS = 300
+ALERT_REPEAT_HOURS = 24
+
+_SEVERITY = {None: 0, 'low': 1, 'out': 2}
+
+
+class VelocityWindow:
+    """Units sold per product over a sliding window of whole days."""
+
+    def __init__(self, days=VELOCITY_WINDOW_DAYS):
+        self.days = days
+        self.per_day = {}   # day -> {product_id: units}
+        self.totals = {}    # product_id -> units in the window
+        self._read = set()  # days already loaded from the rollups
+
+    def _set_day(self, day, units_by_product):
+        for product_id, units in self.per_day.pop(day, {}).items():
+            self.totals[product_id] -= units
+            if not self.totals[product_id]:
+                del self.totals[product_id]
+        if units_by_product:
+            self.per_day[day] = units_by_product
+            for product_id, units in units_by_product.items():
+                self.totals[product_id] = self.totals.get(product_id, 0) + units
+
+    def refresh(self, today):
+        """Slide the window to end at today, reading as few rollup rows as possible."""
+        first = today - timedelta(days=self.days - 1)
+        for day in [d for d in self.per_day if d < first]:
+            self._set_day(day, {})
+        self._read = {d for d in self._read if d >= first}
+        # days never read, plus the two that can still change
+        unread = [first + timedelta(days=i) for i in range(self.days)
+                  if first + timedelta(days=i) not in self._read]
+        reload_from = max(first, min(unread + [today - timedelta(days=1)]))
+        loaded = {}
+        for day, product_id, units in db.session.execute(
+                select(DailyProductSales.day, DailyProductSales.product_id, DailyProductSales.units)
+                .where(DailyProductSales.day >= reload_from, DailyProductSales.day <= today)):
+            loaded.setdefault(day, {})[product_id] = units
+        day = reload_from
+        while day <= today:
+            self._set_day(day, loaded.get(day, {}))
+            self._read.add(day)
+            day += timedelta(days=1)
+
+    def velocity(self, product_id):
+        """Average units sold per day."""
+        return self.totals.get(product_id, 0) / self.days
+
+
+def assess(product, velocity, low_stock_days=LOW_STOCK_DAYS,
+           lead_days=REORDER_LEAD_DAYS, cover_days=REORDER_COVER_DAYS):
+    """Stock outlook for one product row (id, name, sku, stock)."""
+    days_left = product.stock / velocity if velocity > 0 else None
+    if product.stock <= 0:
+        level = 'out'
+    elif days_left is not None and days_left <= low_stock_days:
+        level = 'low'
+    else:
+        level = None
+    reorder = max(0, math.ceil(velocity * (lead_days + cover_days)) - product.stock) if velocity > 0 else 0
+    return {'product_id': product.id, 'name': product.name, 'sku': product.sku,
+            'stock': product.stock, 'velocity': velocity, 'days_left': days_left,
+            'level': level, 'reorder_qty': reorder}
+
+
+class InventoryMonitor:
+    """Periodic stock check that batches alerts into one notification."""
+
+    def __init__(self, app, notifier=None):
+        self.app = app
+        config = app.config
+        self.notifier = notifier or make_notifier(config)
+        self.window = VelocityWindow(config.get('VELOCITY_WINDOW_DAYS', VELOCITY_WINDOW_DAYS))
+        self.low_stock_days = config.get('LOW_STOCK_DAYS', LOW_STOCK_DAYS)
+        self.lead_days = config.get('REORDER_LEAD_DAYS', REORDER_LEAD_DAYS)
+        self.cover_days = config.get('REORDER_COVER_DAYS', REORDER_COVER_DAYS)
+        self.interval = config.get('INVENTORY_CHECK_SECONDS', INVENTORY_CHECK_SECONDS)
+        self.repeat_after = timedelta(hours=config.get('ALERT_REPEAT_HOURS', ALERT_REPEAT_HOURS))
+        self._alerted = {}  # product_id -> (level, when)
+
+    def outlook(self):
+        """Assessment of every product, most urgent first."""
+        with self.app.app_context():
+            try:
+                self.window.refresh(datetime.utcnow().date())
+                products = db.session.execute(
+                    select(Product.id, Product.name, Product.sku, Product.stock)).all()
+            finally:
+                db.session.remove()
+        items = [assess(p, self.window.velocity(p.id), self.low_stock_days, self.lead_days, self.cover_days)
+                 for p in products]
+        items.sort(key=lambda i: (-_SEVERITY[i['level']],
+                                  i['days_left'] if i['days_left'] is not None else math.inf))
+        return items
+
+    def check(self):
+        """Assess stock and send alerts that are new or got worse; returns them."""
+        now = datetime.utcnow()
+        alerts = []
+        for item in self.outlook():
+            product_id, level = item['product_id'], item['level']
+            if level is None:
+                self._alerted.pop(product_id, None)  # recovered; alert again if it drops
+                continue
+            previous = self._alerted.get(product_id)
+            if (previous is None or _SEVERITY[level] > _SEVERITY[previous[0]]
+                    or now - previous[1] >= self.repeat_after):
+                alerts.append(item)
+        if alerts:
+            out = sum(1 for a in alerts if a['level'] == 'out')
+            subject = f'[Pulse Pharmacy] {out} out of stock, {len(alerts) - out} running low'
+            self.notifier.send(subject, '\n'.join(format_item(a) for a in alerts))
+            # only remembered once delivered, so a failed send is retried next check
+            for item in alerts:
+                self._alerted[item['product_id']] = (item['level'], now)
+        return alerts
+
+    def run(self, stop_event):
+        """Check now and then every interval until stop_event is set."""
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                print('Inventory check failed:', str(e))
+            if stop_event.wait(self.interval):
+                return
+
+
+def format_item(item):
+    days_left = 'n/a' if item['days_left'] is None else f"{item['days_left']:.1f} days"
+    return (f"{(item['level'] or 'ok').upper():<4} {item['name']} ({item['sku'] or 'no sku'}): "
+            f"stock {item['stock']}, sells {item['velocity']:.2f}/day, stockout in {days_left}, "
+            f"reorder {item['reorder_qty']}")
+
+
+def start_inventory_monitor(app, notifier=None):
+    """Run the monitor on a daemon thread; returns the event that stops it."""
+    stop_event = threading.Event()
+    monitor = InventoryMonitor(app, notifier)
+    threading.Thread(target=monitor.run, args=(stop_event,), name='inventory-monitor',
+                     daemon=True).start()
+    return stop_event
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Low-stock alerts and reorder suggestions')
+    parser.add_argument('--once', action='store_true', help='run one check and exit')
+    parser.add_argument('--report', action='store_true', help='print the outlook without alerting')
+    args = parser.parse_args()
+    monitor = InventoryMonitor(app)
+    if args.report:
+        for item in monitor.outlook():
+            if item['level'] or item['velocity']:
+                print(format_item(item))
+    elif args.once:
+        print(f'{len(monitor.check())} alerts sent')
+    else:
+        monitor.run(threading.Event())
@@ -0,0 +1,270 @@
+"""Durable background jobs stored in the jobs table.
+
+enqueue() adds a row in the caller's transaction, so a job exists exactly
+when the order or status change that caused it is committed; nothing
+slow (SMTP, HTTP) runs inside a request. An idempotency_key makes
+enqueueing the same work twice a no-op.
+
+Workers claim due jobs in batches (SELECT ... FOR UPDATE SKIP LOCKED
+where the database has it, then a conditional UPDATE so two workers can
+never both win a job), hand each kind's batch to its handler, and record
+the outcome. Failed jobs are retried with exponential backoff and jitter
+up to max_attempts, then left as 'failed' for inspection; jobs whose
+worker died are requeued after JOB_LOCK_TIMEOUT_SECONDS.
+
+Handlers are registered with @job_handler(kind) and take a list of
+payloads, returning one exception (or None) per payload; see
+notifications.py.
+
+Run:
+    python jobs.py [--threads 4]   # work until interrupted
+    python jobs.py --once          # drain what is due now and exit
+    python jobs.py --retry-failed  # requeue jobs that ran out of attempts
+
+or set JOB_WORKER_THREADS to run workers inside the app process.
+"""
+import json
+import os
+import random
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Job
+
+JOB_BATCH_SIZE = 50
+JOB_POLL_SECONDS = 1.0
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 30
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_LOCK_TIMEOUT_SECONDS = 300
+JOB_RETENTION_DAYS = 7  # finished jobs are purged after this; failed ones are kept
+DAILY_JOBS = ('retention',)  # queued once per UTC day by the maintenance thread (archive.py)
+
+HANDLERS = {}  # kind -> function(payloads) -> [exception or None, ...]
+
+
+def job_handler(kind):
+    """Register the function that processes batches of `kind` jobs."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload, idempotency_key=None, run_at=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Queue a job in the current transaction; returns its id, or None if the key exists."""
+    if idempotency_key and db.session.execute(
+            select(Job.id).where(Job.idempotency_key == idempotency_key)).first():
+        return None
+    try:
+        # savepoint, so a racing duplicate key does not undo the caller's work
+        with db.session.begin_nested():
+            result = db.session.execute(insert(Job).values(
+                kind=kind, payload=json.dumps(payload), idempotency_key=idempotency_key,
+                status='queued', attempts=0, max_attempts=max_attempts,
+                run_at=run_at or datetime.utcnow(), created_at=datetime.utcnow()))
+    except IntegrityError:
+        return None
+    return result.inserted_primary_key[0]
+
+
+def retry_delay(attempts):
+    """Seconds before retry number `attempts`: doubling, capped, with +-20% jitter."""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobWorker:
+    """Claims and runs due jobs; one per thread."""
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = app.config.get('JOB_BATCH_SIZE', JOB_BATCH_SIZE)
+        self.poll_seconds = app.config.get('JOB_POLL_SECONDS', JOB_POLL_SECONDS)
+        self.lock_timeout = timedelta(seconds=app.config.get('JOB_LOCK_TIMEOUT_SECONDS', JOB_LOCK_TIMEOUT_SECONDS))
+
+    def requeue_stale(self):
+        """Release jobs whose worker stopped without finishing them."""
+        now = datetime.utcnow()
+        stale = (Job.status == 'running', Job.locked_at < now - self.lock_timeout)
+        db.session.execute(update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+                           .values(status='failed', locked_by=None, finished_at=now,
+                                   last_error='worker timed out'))
+        db.session.execute(update(Job).where(*stale)
+                           .values(status='queued', locked_by=None, run_at=now))
+        db.session.commit()
+
+    def claim(self):
+        """Mark up to batch_size due jobs as ours; returns their rows."""
+        now = datetime.utcnow()
+        token = f'{self.name}:{uuid.uuid4().hex[:12]}'
+        ids = db.session.execute(
+            select(Job.id).where(Job.status == 'queued', Job.run_at <= now)
+            .order_by(Job.run_at, Job.id).limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+        # without SKIP LOCKED two workers may pick the same ids; only one update wins each row
+        db.session.execute(update(Job).where(Job.id.in_(ids), Job.status == 'queued')
+                           .values(status='running', locked_by=token, locked_at=now,
+                                   attempts=Job.attempts + 1))
+        jobs = db.session.execute(
+            select(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.locked_by)
+            .where(Job.id.in_(ids), Job.locked_by == token)
+        ).all()
+        db.session.commit()
+        return jobs
+
+    def _finish(self, jobs, errors):
+        now = datetime.utcnow()
+        done = [job for job, error in zip(jobs, errors) if error is None]
+        if done:
+            db.session.execute(
+                update(Job).where(Job.id.in_([j.id for j in done]), Job.locked_by == done[0].locked_by)
+                .values(status='done', locked_by=None, finished_at=now, last_error=None))
+        for job, error in zip(jobs, errors):
+            if error is None:
+                continue
+            values = {'locked_by': None, 'last_error': f'{type(error).__name__}: {error}'[:1000]}
+            if job.attempts >= job.max_attempts:
+                values.update(status='failed', finished_at=now)
+            else:
+                values.update(status='queued', run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+            db.session.execute(update(Job).where(Job.id == job.id, Job.locked_by == job.locked_by)
+                               .values(**values))
+        db.session.commit()
+
+    def run_once(self):
+        """Process one batch; returns the number of jobs it handled."""
+        with self.app.app_context():
+            try:
+                jobs = self.claim()
+                by_kind = {}
+                for job in jobs:
+                    by_kind.setdefault(job.kind, []).append(job)
+                for kind, batch in by_kind.items():
+                    handler = HANDLERS.get(kind)
+                    try:
+                        if handler is None:
+                            raise LookupError(f'no handler for job kind {kind!r}')
+                        errors = handler([json.loads(job.payload) for job in batch])
+                    except Exception as e:
+                        errors = [e] * len(batch)
+                    self._finish(batch, errors)
+                return len(jobs)
+            finally:
+                db.session.remove()
+
+    def run(self, stop_event):
+        """Work until stop_event is set, sleeping only when the queue is empty."""
+        while not stop_event.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                print('Job worker failed:', str(e))
+                handled = 0
+            if not handled:
+                stop_event.wait(self.poll_seconds)
+
+
+def purge_finished(days=JOB_RETENTION_DAYS, batch_size=1000):
+    """Delete done jobs finished more than `days` ago; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    purged = 0
+    while True:
+        ids = db.session.execute(select(Job.id).where(Job.status == 'done', Job.finished_at < cutoff)
+                                 .limit(batch_size)).scalars().all()
+        if not ids:
+            return purged
+        db.session.execute(delete(Job).where(Job.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+
+
+def retry_failed():
+    """Give every failed job a fresh set of attempts; returns how many."""
+    result = db.session.execute(update(Job).where(Job.status == 'failed').values(
+        status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None))
+    db.session.commit()
+    return result.rowcount
+
+
+def enqueue_daily_jobs():
+    """Queue today's run of each registered daily job; the key makes it once per day cluster-wide."""
+    today = datetime.utcnow().date().isoformat()
+    for kind in DAILY_JOBS:
+        if kind in HANDLERS:
+            enqueue(kind, {}, idempotency_key=f'{kind}:{today}')
+    db.session.commit()
+
+
+def _maintain(app, worker, stop_event, interval=3600):
+    while True:
+        try:
+            with app.app_context():
+                try:
+                    worker.requeue_stale()
+                    purge_finished(app.config.get('JOB_RETENTION_DAYS', JOB_RETENTION_DAYS))
+                    enqueue_daily_jobs()
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            print('Job maintenance failed:', str(e))
+        if stop_event.wait(min(interval, worker.lock_timeout.total_seconds())):
+            return
+
+
+def start_job_workers(app, threads=1):
+    """Run `threads` workers plus housekeeping on daemon threads; returns the stop event."""
+    import analytics, archive, notifications  # noqa: F401  register the handlers
+    stop_event = threading.Event()
+    base = f'{socket.gethostname()}:{os.getpid()}'
+    workers = [JobWorker(app, f'{base}:{i}') for i in range(threads)]
+    for i, worker in enumerate(workers):
+        threading.Thread(target=worker.run, args=(stop_event,), name=f'job-worker-{i}', daemon=True).start()
+    threading.Thread(target=_maintain, args=(app, workers[0], stop_event), name='job-maintenance',
+                     daemon=True).start()
+    return stop_event
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import script_app
+    app = script_app()
+
+    parser = argparse.ArgumentParser(description='Run background jobs')
+    parser.add_argument('--threads', type=int, default=app.config.get('JOB_WORKER_THREADS') or 2)
+    parser.add_argument('--once', action='store_true', help='process due jobs and exit')
+    parser.add_argument('--retry-failed', action='store_true', help='requeue failed jobs and exit')
+    args = parser.parse_args()
+    import analytics, archive, notifications  # noqa: F401  register the handlers
+    with app.app_context():
+        if args.retry_failed:
+            print(f'{retry_failed()} failed jobs requeued')
+            raise SystemExit
+    if args.once:
+        worker = JobWorker(app)
+        with app.app_context():
+            worker.requeue_stale()
+        total = 0
+        while True:
+            handled = worker.run_once()
+            if not handled:
+                break
+            total += handled
+        print(f'{total} jobs processed')
+    else:
+        stop_event = start_job_workers(app, args.threads)
+        try:
+            while not stop_event.wait(60):
+                pass
+        except KeyboardInterrupt:
+            stop_event.set()
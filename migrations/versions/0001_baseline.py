@@ -0,0 +1,134 @@
+"""baseline schema
+
+The tables as the app first shipped them. Databases that were created
+before migrations existed are stamped instead of upgraded through this
+(see fix_migrations.py).
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('password_hash', sa.String(length=300), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+
+    op.create_table(
+        'admins',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('password_hash', sa.String(length=300), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=True),
+        sa.Column('is_super', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_admins_username', 'admins', ['username'], unique=True)
+
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('category', sa.String(length=100), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('description', sa.String(length=500), nullable=True),
+        sa.Column('image', sa.String(length=300), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_products_category', 'products', ['category'], unique=False)
+
+    op.create_table(
+        'addresses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('label', sa.String(length=50), nullable=True),
+        sa.Column('recipient_name', sa.String(length=200), nullable=True),
+        sa.Column('phone', sa.String(length=50), nullable=True),
+        sa.Column('street', sa.String(length=300), nullable=True),
+        sa.Column('city', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_addresses_user_id', 'addresses', ['user_id'], unique=False)
+
+    op.create_table(
+        'prescriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('prescription_number', sa.String(length=50), nullable=True),
+        sa.Column('filename', sa.String(length=300), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+        sa.Column('doctor_name', sa.String(length=200), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('prescription_number'),
+    )
+    op.create_index('ix_prescriptions_user_id', 'prescriptions', ['user_id'], unique=False)
+
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('delivery_type', sa.String(length=50), nullable=False),
+        sa.Column('payment_method', sa.String(length=50), nullable=False),
+        sa.Column('address_id', sa.Integer(), nullable=False),
+        sa.Column('delivery_fee', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['address_id'], ['addresses.id'], ondelete='RESTRICT'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_orders_address_id', 'orders', ['address_id'], unique=False)
+    op.create_index('ix_orders_user_id', 'orders', ['user_id'], unique=False)
+
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=200), nullable=False),
+        sa.Column('qty', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='RESTRICT'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+    op.create_index('ix_order_items_product_id', 'order_items', ['product_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    op.drop_table('prescriptions')
+    op.drop_table('addresses')
+    op.drop_table('products')
+    op.drop_table('admins')
+    op.drop_table('users')
@@ -0,0 +1,87 @@
+"""legacy column fix-ups and backfills
+
+Replaces the startup probes (ensure_password_column, ensure_product_columns,
+ensure_order_columns) and the one-off scripts add_product_name.py and
+update_orders.py. A database created from the baseline already has every
+column, so this only does work on older databases stamped at the
+baseline. Backfills run in short batches, each committed on its own, so
+no lock on order_items or orders is held for longer than one batch.
+
+Revision ID: 0002_legacy_fixups
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_legacy_fixups'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+LEGACY_COLUMNS = {
+    'users': [sa.Column('password_hash', sa.String(length=300), nullable=True)],
+    'products': [sa.Column('stock', sa.Integer(), nullable=True),
+                 sa.Column('is_active', sa.Boolean(), nullable=True)],
+    'orders': [sa.Column('address_id', sa.Integer(), nullable=True),
+               sa.Column('delivery_fee', sa.Integer(), nullable=True)],
+    'order_items': [sa.Column('product_name', sa.String(length=200), nullable=True)],
+}
+
+
+def _batched(sql, table):
+    """Run an UPDATE with :lo/:hi id bounds over the table, one commit per batch."""
+    bind = op.get_bind()
+    top = bind.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    with op.get_context().autocommit_block():
+        for lo in range(1, top + 1, BATCH_SIZE):
+            bind.execute(sa.text(sql), {'lo': lo, 'hi': lo + BATCH_SIZE - 1})
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    added = set()
+    for table, columns in LEGACY_COLUMNS.items():
+        existing = {c['name'] for c in inspector.get_columns(table)}
+        missing = [c for c in columns if c.name not in existing]
+        if missing:
+            # added nullable (instant on MySQL 8); tightened below once filled
+            with op.batch_alter_table(table) as batch_op:
+                for column in missing:
+                    batch_op.add_column(column)
+                    added.add((table, column.name))
+
+    # add_product_name.py: order lines keep the product name at order time
+    _batched("""
+        UPDATE order_items SET product_name = (
+            SELECT products.name FROM products WHERE products.id = order_items.product_id)
+        WHERE id BETWEEN :lo AND :hi AND (product_name IS NULL OR product_name = '')
+    """, 'order_items')
+    if ('products', 'stock') in added:
+        _batched('UPDATE products SET stock = 0 WHERE id BETWEEN :lo AND :hi AND stock IS NULL', 'products')
+    if ('products', 'is_active') in added:
+        _batched('UPDATE products SET is_active = 1 WHERE id BETWEEN :lo AND :hi AND is_active IS NULL', 'products')
+    if ('orders', 'delivery_fee') in added:
+        _batched('UPDATE orders SET delivery_fee = 0 WHERE id BETWEEN :lo AND :hi AND delivery_fee IS NULL', 'orders')
+    # update_orders.py: orders saved without an owner go to the first user
+    _batched("""
+        UPDATE orders SET user_id = (SELECT MIN(id) FROM users)
+        WHERE id BETWEEN :lo AND :hi AND user_id IS NULL
+    """, 'orders')
+
+    not_null = {('products', 'stock'): sa.Integer(), ('orders', 'delivery_fee'): sa.Integer(),
+                ('order_items', 'product_name'): sa.String(length=200)}
+    for (table, column), type_ in not_null.items():
+        if (table, column) in added:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.alter_column(column, existing_type=type_, nullable=False)
+
+
+def downgrade():
+    # the baseline already has these columns; nothing to undo
+    pass
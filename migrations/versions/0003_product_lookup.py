@@ -0,0 +1,67 @@
+"""unique product name and sku lookups
+
+Checkout resolves a whole cart by name or SKU in one query. Products that
+share a name (the old checkout could create the same name twice) are
+merged into the oldest one first, with their order lines repointed and
+their stock added to it; each merge is printed. Databases adopted from
+the startup probes (ensure_product_columns) already have products.sku,
+so the column is only added where it is missing.
+
+Revision ID: 0003_product_lookup
+Revises: 0002_legacy_fixups
+Create Date: 2026-10-18 09:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_product_lookup'
+down_revision = '0002_legacy_fixups'
+branch_labels = None
+depends_on = None
+
+
+REFERENCING_TABLES = ('order_items', 'cart_items')  # product_id columns to repoint
+
+
+def _merge_duplicate_names():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+    names = bind.execute(sa.text(
+        'SELECT name FROM products GROUP BY name HAVING COUNT(*) > 1')).scalars().all()
+    for name in names:
+        rows = bind.execute(sa.text(
+            'SELECT id, stock, is_active FROM products WHERE name = :name ORDER BY id'), {'name': name}).all()
+        keep, dupes = rows[0], rows[1:]
+        dupe_ids = [r.id for r in dupes]
+        for table in REFERENCING_TABLES:
+            if table in existing:
+                bind.execute(sa.text(f'UPDATE {table} SET product_id = :keep WHERE product_id IN :ids')
+                             .bindparams(sa.bindparam('ids', expanding=True)), {'keep': keep.id, 'ids': dupe_ids})
+        bind.execute(sa.text('UPDATE products SET stock = :stock, is_active = :active WHERE id = :id'), {
+            'id': keep.id,
+            'stock': sum(r.stock or 0 for r in rows),
+            'active': any(r.is_active for r in rows),
+        })
+        bind.execute(sa.text('DELETE FROM products WHERE id IN :ids')
+                     .bindparams(sa.bindparam('ids', expanding=True)), {'ids': dupe_ids})
+        print(f'0003: merged products {dupe_ids} into {keep.id} ({name!r})')
+
+
+def upgrade():
+    _merge_duplicate_names()
+    has_sku = 'sku' in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('products')}
+    with op.batch_alter_table('products') as batch_op:
+        if not has_sku:
+            batch_op.add_column(sa.Column('sku', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_products_name', ['name'], unique=True)
+        batch_op.create_index('ix_products_sku', ['sku'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_index('ix_products_sku')
+        batch_op.drop_index('ix_products_name')
+        batch_op.drop_column('sku')
@@ -0,0 +1,29 @@
+"""order listing indexes for keyset pagination
+
+(created_at, id) for the admin order list and (user_id, created_at, id)
+for each customer's history, both read newest first.
+
+Revision ID: 0004_order_keyset_indexes
+Revises: 0003_product_lookup
+Create Date: 2026-10-18 09:15:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_order_keyset_indexes'
+down_revision = '0003_product_lookup'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], unique=False)
+    op.create_index('ix_orders_user_created_at_id', 'orders', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_orders_user_created_at_id', table_name='orders')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
@@ -0,0 +1,49 @@
+"""content-addressed prescription files
+
+Revision ID: 0005_prescription_blobs
+Revises: 0004_order_keyset_indexes
+Create Date: 2026-10-18 09:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_prescription_blobs'
+down_revision = '0004_order_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'prescription_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=300), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+    )
+    op.create_index('ix_prescription_blobs_ref_count', 'prescription_blobs', ['ref_count'], unique=False)
+
+    mysql = op.get_bind().dialect.name == 'mysql'
+    if mysql:
+        # the new column is all NULL; skipping the check lets MySQL add the key in place
+        op.execute('SET foreign_key_checks = 0')
+    with op.batch_alter_table('prescriptions') as batch_op:
+        batch_op.add_column(sa.Column('blob_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_prescriptions_blob_sha256', ['blob_sha256'], unique=False)
+        batch_op.create_foreign_key('fk_prescriptions_blob_sha256', 'prescription_blobs',
+                                    ['blob_sha256'], ['sha256'])
+    if mysql:
+        op.execute('SET foreign_key_checks = 1')
+
+
+def downgrade():
+    with op.batch_alter_table('prescriptions') as batch_op:
+        batch_op.drop_constraint('fk_prescriptions_blob_sha256', type_='foreignkey')
+        batch_op.drop_index('ix_prescriptions_blob_sha256')
+        batch_op.drop_column('blob_sha256')
+    op.drop_table('prescription_blobs')
@@ -0,0 +1,59 @@
+"""daily sales rollup tables
+
+Filled by checkout and status changes; back-fill history with
+`python analytics.py --backfill`.
+
+Revision ID: 0006_sales_rollups
+Revises: 0005_prescription_blobs
+Create Date: 2026-10-18 09:25:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_sales_rollups'
+down_revision = '0005_prescription_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_sales',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('delivered_orders', sa.Integer(), nullable=False),
+        sa.Column('cancelled_orders', sa.Integer(), nullable=False),
+        sa.Column('cancelled_revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+    )
+    op.create_table(
+        'daily_product_sales',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=200), nullable=False),
+        sa.Column('category', sa.String(length=100), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'product_id'),
+    )
+    op.create_index('ix_daily_product_sales_category', 'daily_product_sales', ['category'], unique=False)
+    op.create_table(
+        'daily_order_splits',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('dimension', sa.String(length=30), nullable=False),
+        sa.Column('value', sa.String(length=50), nullable=False),
+        sa.Column('orders', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'dimension', 'value'),
+    )
+
+
+def downgrade():
+    op.drop_table('daily_order_splits')
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
@@ -0,0 +1,61 @@
+"""order to prescription link and prescription archive
+
+Revision ID: 0009_prescription_archive
+Revises: 0008_cart_and_idempotency
+Create Date: 2026-10-18 09:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_prescription_archive'
+down_revision = '0008_cart_and_idempotency'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    mysql = op.get_bind().dialect.name == 'mysql'
+    if mysql:
+        # the new column is all NULL; skipping the check lets MySQL add the key in place
+        op.execute('SET foreign_key_checks = 0')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.add_column(sa.Column('prescription_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_orders_prescription_id', ['prescription_id'], unique=False)
+        batch_op.create_foreign_key('fk_orders_prescription_id', 'prescriptions',
+                                    ['prescription_id'], ['id'], ondelete='SET NULL')
+    if mysql:
+        op.execute('SET foreign_key_checks = 1')
+
+    op.create_table(
+        'prescription_archives',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('original_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('prescription_number', sa.String(length=50), nullable=True),
+        sa.Column('filename', sa.String(length=300), nullable=False),
+        sa.Column('blob_sha256', sa.String(length=64), nullable=True),
+        sa.Column('doctor_name', sa.String(length=200), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['blob_sha256'], ['prescription_blobs.sha256']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_prescription_archives_archived_at', 'prescription_archives', ['archived_at'], unique=False)
+    op.create_index('ix_prescription_archives_blob_sha256', 'prescription_archives', ['blob_sha256'], unique=False)
+    op.create_index('ix_prescription_archives_order_id', 'prescription_archives', ['order_id'], unique=False)
+    op.create_index('ix_prescription_archives_original_id', 'prescription_archives', ['original_id'], unique=False)
+    op.create_index('ix_prescription_archives_user_id', 'prescription_archives', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('prescription_archives')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_constraint('fk_orders_prescription_id', type_='foreignkey')
+        batch_op.drop_index('ix_orders_prescription_id')
+        batch_op.drop_column('prescription_id')
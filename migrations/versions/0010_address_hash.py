@@ -0,0 +1,31 @@
+"""normalised address key
+
+Existing rows stay NULL until `python addresses.py --merge` hashes them
+and merges duplicates.
+
+Revision ID: 0010_address_hash
+Revises: 0009_prescription_archive
+Create Date: 2026-10-18 09:45:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_address_hash'
+down_revision = '0009_prescription_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('addresses') as batch_op:
+        batch_op.add_column(sa.Column('addr_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_addresses_user_addr_hash', ['user_id', 'addr_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('addresses') as batch_op:
+        batch_op.drop_constraint('uq_addresses_user_addr_hash', type_='unique')
+        batch_op.drop_column('addr_hash')
@@ -0,0 +1,40 @@
+"""prescription review queue index and claims
+
+Revision ID: 0011_prescription_queue
+Revises: 0010_address_hash
+Create Date: 2026-10-18 09:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_prescription_queue'
+down_revision = '0010_address_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    mysql = op.get_bind().dialect.name == 'mysql'
+    if mysql:
+        # the new column is all NULL; skipping the check lets MySQL add the key in place
+        op.execute('SET foreign_key_checks = 0')
+    with op.batch_alter_table('prescriptions') as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_prescriptions_claimed_by', 'admins',
+                                    ['claimed_by'], ['id'], ondelete='SET NULL')
+        batch_op.create_index('ix_prescriptions_status_uploaded_at_id', ['status', 'uploaded_at', 'id'],
+                              unique=False)
+    if mysql:
+        op.execute('SET foreign_key_checks = 1')
+
+
+def downgrade():
+    with op.batch_alter_table('prescriptions') as batch_op:
+        batch_op.drop_index('ix_prescriptions_status_uploaded_at_id')
+        batch_op.drop_constraint('fk_prescriptions_claimed_by', type_='foreignkey')
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
@@ -0,0 +1,75 @@
+"""order archive tables for retention
+
+prescription_archives.order_id may now point at an archived order, so
+any foreign key from it to orders (databases adopted from the old
+startup probes have one) is dropped.
+
+Revision ID: 0012_order_archives
+Revises: 0011_prescription_queue
+Create Date: 2026-10-18 09:55:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012_order_archives'
+down_revision = '0011_prescription_queue'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'order_archives',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('delivery_type', sa.String(length=50), nullable=False),
+        sa.Column('payment_method', sa.String(length=50), nullable=False),
+        sa.Column('address_id', sa.Integer(), nullable=False),
+        sa.Column('delivery_fee', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('prescription_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_archives_address_id', 'order_archives', ['address_id'], unique=False)
+    op.create_index('ix_order_archives_created_at', 'order_archives', ['created_at'], unique=False)
+    op.create_index('ix_order_archives_user_created_at_id', 'order_archives', ['user_id', 'created_at', 'id'],
+                    unique=False)
+
+    op.create_table(
+        'order_item_archives',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=200), nullable=False),
+        sa.Column('qty', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['order_archives.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_order_item_archives_order_id', 'order_item_archives', ['order_id'], unique=False)
+    op.create_index('ix_order_item_archives_product_id', 'order_item_archives', ['product_id'], unique=False)
+
+    to_orders = [fk['name'] for fk in sa.inspect(op.get_bind()).get_foreign_keys('prescription_archives')
+                 if fk['referred_table'] == 'orders' and fk['name']]
+    with op.batch_alter_table('prescription_archives') as batch_op:
+        for name in to_orders:
+            batch_op.drop_constraint(name, type_='foreignkey')
+        batch_op.add_column(sa.Column('type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('claimed_by', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('prescription_archives') as batch_op:
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
+        batch_op.drop_column('type')
+    op.drop_table('order_item_archives')
+    op.drop_table('order_archives')
@@ -1,15 +1,30 @@
 from datetime import datetime
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from config import RoutingSession
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+# RoutingSession lets read-only views use the read replica (see config.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# werkzeug hash method and cost, overridable with PASSWORD_HASH_METHOD
+# (e.g. 'pbkdf2:sha256:600000'); older hashes are upgraded at login (auth.py)
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+
+
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD)
+    return PASSWORD_HASH_METHOD
 
 
 class Product(db.Model):
     __tablename__ = 'products'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    category = db.Column(db.String(100), nullable=False, index=True)
+    # unique indexes so checkout can resolve a whole cart in one lookup
+    name = db.Column(db.String(200), unique=True, nullable=False, index=True)
+    sku = db.Column(db.String(100), unique=True, index=True)
+    category = db.Column(db.String(100), nullable=False, default='other', index=True)
     price = db.Column(db.Integer, nullable=False)  # price in whole currency units
     stock = db.Column(db.Integer, nullable=False, default=0)
     is_active = db.Column(db.Boolean, default=True)
@@ -21,6 +36,7 @@ class Product(db.Model):
         return {
             'id': self.id,
             'name': self.name,
+            'sku': self.sku,
             'category': self.category,
             'price': self.price,
             'stock': self.stock,
@@ -32,6 +48,9 @@ class Product(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    # back keyset pagination of the admin order list and of each customer's history (newest first)
+    __table_args__ = (db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+                      db.Index('ix_orders_user_created_at_id', 'user_id', 'created_at', 'id'))
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     total = db.Column(db.Integer, nullable=False)
@@ -42,6 +61,8 @@ class Order(db.Model):
     address_id = db.Column(db.Integer, db.ForeignKey('addresses.id', ondelete='RESTRICT'), nullable=False, index=True)
     delivery_fee = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # prescription this order was filled against; archived when the order is delivered
+    prescription_id = db.Column(db.Integer, db.ForeignKey('prescriptions.id', ondelete='SET NULL'), index=True)
     
     # Relationships
     user = db.relationship('User', backref=db.backref('orders', lazy=True))
@@ -59,6 +80,7 @@ class Order(db.Model):
             'address_id': self.address_id,
             'delivery_fee': self.delivery_fee,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'prescription_id': self.prescription_id,
         }
 
 
@@ -86,19 +108,42 @@ class OrderItem(db.Model):
         }
 
 
+class CartItem(db.Model):
+    """One line of a user's server-side cart (see cart.py)."""
+    __tablename__ = 'cart_items'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class IdempotencyKey(db.Model):
+    """Result of an order submission, replayed for retries with the same key (see idempotency.py)."""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='SET NULL'))
+    response = db.Column(db.Text)  # JSON body of the original 200 response
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     username = db.Column(db.String(150), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(300), nullable=True)
+    email = db.Column(db.String(254))  # where order and prescription notifications go
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # one-to-many: a user can have multiple saved addresses
     addresses = db.relationship('Address', backref='user', cascade='all, delete-orphan')
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
 
     def check_password(self, password: str) -> bool:
         if not self.password_hash:
@@ -116,7 +161,7 @@ class Admin(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
 
     def check_password(self, password: str) -> bool:
         if not self.password_hash:
@@ -126,6 +171,8 @@ class Admin(db.Model):
 
 class Address(db.Model):
     __tablename__ = 'addresses'
+    # checkout finds a saved address with one probe on (user_id, addr_hash); see addresses.py
+    __table_args__ = (db.UniqueConstraint('user_id', 'addr_hash', name='uq_addresses_user_addr_hash'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
     label = db.Column(db.String(50))  # e.g., 'Home', 'Work'
@@ -133,6 +180,7 @@ class Address(db.Model):
     phone = db.Column(db.String(50))
     street = db.Column(db.String(300))
     city = db.Column(db.String(100))
+    addr_hash = db.Column(db.String(64))  # normalised street + city; NULL until merged
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -149,27 +197,213 @@ class Address(db.Model):
 
 class Prescription(db.Model):
     __tablename__ = 'prescriptions'
+    # the pharmacists' work queue walks one status oldest-first (see prescription_queue.py)
+    __table_args__ = (db.Index('ix_prescriptions_status_uploaded_at_id', 'status', 'uploaded_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     prescription_number = db.Column(db.String(50), unique=True)
-    filename = db.Column(db.String(300), nullable=False)
+    filename = db.Column(db.String(300), nullable=False)  # path under UPLOAD_FOLDER
+    # content-addressed file (see blobstore.py); NULL for legacy uploads
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('prescription_blobs.sha256'), index=True)
     uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     # notes column removed (no longer stored)
     doctor_name = db.Column(db.String(200))
-    status = db.Column(db.String(50), nullable=False, default='pending')  # pending, processing, ready, completed, rejected
+    status = db.Column(db.String(50), nullable=False, default='pending')  # received, failed (upload post-processing), pending, processing, ready, completed, rejected
     type = db.Column(db.String(50), nullable=False, default='upload')  # upload, refill, transfer
+    # pharmacist who claimed it from the queue, and when
+    claimed_by = db.Column(db.Integer, db.ForeignKey('admins.id', ondelete='SET NULL'))
+    claimed_at = db.Column(db.DateTime)
 
     # Relationship with user
     user = db.relationship('User', backref=db.backref('prescriptions', lazy=True))
 
+    def assign_number(self):
+        """Set the public RX number from the primary key (call after flush).
+
+        Unlike a timestamp, the id can never collide, even for uploads that
+        land in the same second.
+        """
+        uploaded = self.uploaded_at or datetime.utcnow()
+        self.prescription_number = f"RX{uploaded:%Y%m%d}{self.id:06d}"
+
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'prescription_number': self.prescription_number,
             'filename': self.filename,
+            'blob_sha256': self.blob_sha256,
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
             'doctor_name': self.doctor_name,
             'status': self.status,
-            'type': self.type
+            'type': self.type,
+            'claimed_by': self.claimed_by,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None
         }
+
+
+class PrescriptionArchive(db.Model):
+    """A prescription moved out of the working table, delivered or past retention (see archive.py)."""
+    __tablename__ = 'prescription_archives'
+    id = db.Column(db.Integer, primary_key=True)
+    original_id = db.Column(db.Integer, nullable=False, index=True)  # prescriptions.id it had
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, index=True)  # in orders or order_archives, so no FK
+    prescription_number = db.Column(db.String(50))
+    filename = db.Column(db.String(300), nullable=False)  # path under UPLOAD_FOLDER
+    # the archive keeps the blob reference the prescription held
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('prescription_blobs.sha256'), index=True)
+    doctor_name = db.Column(db.String(200))
+    status = db.Column(db.String(50))
+    type = db.Column(db.String(50))
+    uploaded_at = db.Column(db.DateTime)
+    claimed_by = db.Column(db.Integer)
+    claimed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        """Same shape as Prescription.to_dict(), under the original id."""
+        return {
+            'id': self.original_id,
+            'user_id': self.user_id,
+            'prescription_number': self.prescription_number,
+            'filename': self.filename,
+            'blob_sha256': self.blob_sha256,
+            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
+            'doctor_name': self.doctor_name,
+            'status': self.status,
+            'type': self.type,
+            'claimed_by': self.claimed_by,
+            'claimed_at': self.claimed_at.isoformat() if self.claimed_at else None,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+        }
+
+
+class OrderArchive(db.Model):
+    """A closed order past retention, moved out of orders (see archive.py).
+
+    Keeps the order's id, so links and order numbers stay valid; address and
+    product references are plain ids since those rows may change later.
+    """
+    __tablename__ = 'order_archives'
+    __table_args__ = (db.Index('ix_order_archives_user_created_at_id', 'user_id', 'created_at', 'id'),)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(50))
+    delivery_type = db.Column(db.String(50), nullable=False)
+    payment_method = db.Column(db.String(50), nullable=False)
+    address_id = db.Column(db.Integer, nullable=False, index=True)
+    delivery_fee = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    prescription_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    address = db.relationship('Address', primaryjoin='foreign(OrderArchive.address_id) == Address.id',
+                              viewonly=True)
+    items = db.relationship('OrderItemArchive', backref='order', lazy=True, cascade='all, delete-orphan')
+
+    def to_dict(self):
+        """Same shape as Order.to_dict()."""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'total': self.total,
+            'status': self.status,
+            'delivery_type': self.delivery_type,
+            'payment_method': self.payment_method,
+            'address_id': self.address_id,
+            'delivery_fee': self.delivery_fee,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'prescription_id': self.prescription_id,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+        }
+
+
+class OrderItemArchive(db.Model):
+    """A line of an archived order; keeps the order_items id."""
+    __tablename__ = 'order_item_archives'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order_archives.id', ondelete='CASCADE'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    product_name = db.Column(db.String(200), nullable=False)
+    qty = db.Column(db.Integer, nullable=False, default=1)
+    price = db.Column(db.Integer, nullable=False)
+
+    product = db.relationship('Product', primaryjoin='foreign(OrderItemArchive.product_id) == Product.id',
+                              viewonly=True)
+
+    def to_dict(self):
+        """Same shape as OrderItem.to_dict()."""
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'product_id': self.product_id,
+            'product_name': self.product_name,
+            'qty': self.qty,
+            'price': self.price,
+            'product': self.product.to_dict() if self.product else None
+        }
+
+
+class PrescriptionBlob(db.Model):
+    """One stored prescription file, shared by every upload of the same bytes."""
+    __tablename__ = 'prescription_blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(300), nullable=False)  # relative to UPLOAD_FOLDER
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Daily rollups maintained by analytics.py; days are UTC order dates.
+# Cancelled orders are taken out of orders/revenue/units and counted separately.
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)  # order totals incl. delivery fees
+    units = db.Column(db.Integer, nullable=False, default=0)
+    delivered_orders = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_orders = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_revenue = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyProductSales(db.Model):
+    __tablename__ = 'daily_product_sales'
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)  # no FK: rollups outlive products
+    product_name = db.Column(db.String(200), nullable=False)
+    category = db.Column(db.String(100), nullable=False, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)  # qty * price, no delivery fees
+
+
+class DailyOrderSplit(db.Model):
+    __tablename__ = 'daily_order_splits'
+    day = db.Column(db.Date, primary_key=True)
+    dimension = db.Column(db.String(30), primary_key=True)  # delivery_type, payment_method
+    value = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    """Background work queued in the same transaction as the change that caused it (see jobs.py)."""
+    __tablename__ = 'jobs'
+    # the worker polls for due jobs by status and run_at
+    __table_args__ = (db.Index('ix_jobs_status_run_at', 'status', 'run_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    # enqueueing the same key twice is a no-op
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,77 @@
+"""Customer emails for orders and prescriptions, sent through the job queue.
+
+The notify_* functions are called by the views before they commit; they
+only enqueue an 'email' job (jobs.py), keyed so a retried request or a
+repeated click never mails the same thing twice. The worker renders
+nothing: each payload is a finished message, and send_emails() delivers
+a whole batch over one pooled connection of the configured notifier
+(notifier.py, NOTIFIER=smtp in production).
+
+Mail goes to User.email, or to the username when that is an address;
+users with neither are skipped.
+"""
+import threading
+
+from flask import current_app
+
+from jobs import enqueue, job_handler
+from notifier import build_message, make_notifier
+
+MAIL_SENDER = 'orders@pulsepharmacy.local'
+
+_mailer_lock = threading.Lock()
+
+
+def recipient(user):
+    if user is None:
+        return None
+    if user.email:
+        return user.email
+    return user.username if '@' in (user.username or '') else None
+
+
+def queue_email(user, subject, body, key):
+    """Enqueue one message to user; returns the job id or None."""
+    to = recipient(user)
+    if not to:
+        return None
+    return enqueue('email', {'to': to, 'subject': subject, 'body': body}, idempotency_key=key)
+
+
+def notify_order_placed(order, user):
+    lines = [f'Hi {user.name},', '', f'Thank you for your order #{order.id}.', '']
+    lines += [f'  {item.qty} x {item.product_name} @ ₹{item.price}' for item in order.items]
+    lines += [f'  Delivery ({order.delivery_type}): ₹{order.delivery_fee}',
+              f'  Total: ₹{order.total} ({order.payment_method})', '',
+              'We will let you know when it is on its way.', '', 'Pulse Pharmacy']
+    return queue_email(user, f'Order #{order.id} confirmed', '\n'.join(lines),
+                       f'order-placed:{order.id}')
+
+
+def notify_order_status(order, new_status):
+    body = (f'Hi {order.user.name},\n\nYour order #{order.id} is now {new_status}.\n\n'
+            f'Pulse Pharmacy')
+    return queue_email(order.user, f'Order #{order.id}: {new_status}', body,
+                       f'order-status:{order.id}:{new_status}')
+
+
+def notify_prescription_status(prescription, new_status):
+    number = prescription.prescription_number or prescription.id
+    body = (f'Hi {prescription.user.name},\n\nYour prescription {number} is now {new_status}.\n\n'
+            f'Pulse Pharmacy')
+    return queue_email(prescription.user, f'Prescription {number}: {new_status}', body,
+                       f'prescription-status:{prescription.id}:{new_status}')
+
+
+def _mailer():
+    with _mailer_lock:
+        if 'mailer' not in current_app.extensions:
+            current_app.extensions['mailer'] = make_notifier(current_app.config)
+        return current_app.extensions['mailer']
+
+
+@job_handler('email')
+def send_emails(payloads):
+    sender = current_app.config.get('MAIL_SENDER', MAIL_SENDER)
+    messages = [build_message(sender, p['to'], p['subject'], p['body']) for p in payloads]
+    return _mailer().deliver(messages)
@@ -0,0 +1,154 @@
+"""Pluggable delivery of email: operational alerts and customer notifications.
+
+make_notifier(config) picks the backend from NOTIFIER:
+
+- 'log' (default): print the message, handy in development.
+- 'smtp': deliver through SMTP_HOST:SMTP_PORT, with optional STARTTLS
+  and login. Connections are pooled (SMTP_POOL_SIZE) and reused across
+  batches, so a burst of mail costs one handshake, not one per message.
+  Any local SMTP stand-in works for testing, e.g.
+  `python -m aiosmtpd -n -l localhost:1025`.
+
+send() mails a subject/body to the configured ALERT_RECIPIENTS;
+deliver() sends prepared messages in one go and reports per message.
+"""
+import abc
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+SMTP_POOL_SIZE = 2
+SMTP_IDLE_SECONDS = 60  # idle connections older than this are checked with NOOP first
+
+
+def build_message(sender, to, subject, body):
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = sender
+    message['To'] = to if isinstance(to, str) else ', '.join(to)
+    message.set_content(body)
+    return message
+
+
+class Notifier(abc.ABC):
+    """Base class; subclasses implement deliver()."""
+
+    def __init__(self, sender='alerts@pulsepharmacy.local', recipients=()):
+        self.sender = sender
+        self.recipients = list(recipients)
+
+    def send(self, subject, body):
+        """Mail the alert recipients; raises if delivery failed."""
+        if not self.recipients:
+            print('Notifier has no recipients; dropping:', subject)
+            return
+        error = self.deliver([build_message(self.sender, self.recipients, subject, body)])[0]
+        if error is not None:
+            raise error
+
+    @abc.abstractmethod
+    def deliver(self, messages):
+        """Send EmailMessages; returns one exception (or None) per message."""
+
+
+class LogNotifier(Notifier):
+    def send(self, subject, body):
+        print(f'[alert] {subject}\n{body}')
+
+    def deliver(self, messages):
+        for message in messages:
+            print(f"[mail to {message['To']}] {message['Subject']}\n{message.get_content()}")
+        return [None] * len(messages)
+
+
+class SmtpNotifier(Notifier):
+    def __init__(self, host, port, sender, recipients=(), username=None, password=None,
+                 starttls=False, timeout=10, pool_size=SMTP_POOL_SIZE):
+        super().__init__(sender, recipients)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []  # (connection, returned_at)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        return smtp
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                smtp, returned_at = self._idle.pop()
+            if time.monotonic() - returned_at < SMTP_IDLE_SECONDS:
+                return smtp
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            _close(smtp)
+        return self._connect()
+
+    def _checkin(self, smtp):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((smtp, time.monotonic()))
+                return
+        _close(smtp)
+
+    def deliver(self, messages):
+        errors = []
+        try:
+            smtp = self._checkout()
+        except (smtplib.SMTPException, OSError) as e:
+            return [e] * len(messages)
+        for message in messages:
+            try:
+                try:
+                    smtp.send_message(message)
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    # pooled connection went away; reconnect once and retry
+                    _close(smtp)
+                    smtp = self._connect()
+                    smtp.send_message(message)
+                errors.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                errors.append(e)
+        self._checkin(smtp)
+        return errors
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+def make_notifier(config):
+    """Build the notifier configured in a Flask config mapping."""
+    kind = config.get('NOTIFIER', 'log')
+    recipients = config.get('ALERT_RECIPIENTS') or []
+    if isinstance(recipients, str):
+        recipients = [r.strip() for r in recipients.split(',') if r.strip()]
+    sender = config.get('ALERT_SENDER', 'alerts@pulsepharmacy.local')
+    if kind == 'smtp':
+        return SmtpNotifier(
+            config.get('SMTP_HOST', 'localhost'), int(config.get('SMTP_PORT', 25)), sender, recipients,
+            username=config.get('SMTP_USER'), password=config.get('SMTP_PASSWORD'),
+            starttls=bool(config.get('SMTP_STARTTLS', False)),
+            pool_size=int(config.get('SMTP_POOL_SIZE', SMTP_POOL_SIZE)))
+    if kind == 'log':
+        return LogNotifier(sender, recipients)
+    raise ValueError(f'unknown NOTIFIER {kind!r}')
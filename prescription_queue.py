@@ -0,0 +1,92 @@
+"""The pharmacists' prescription review queue.
+
+Only pending and processing prescriptions need work, so the queue is read
+through ix_prescriptions_status_uploaded_at_id: each status is an index
+range in upload order, and delivered history is never scanned. Pages are
+keyset-paginated oldest-first with the customer batch-loaded.
+
+claim_next() hands the oldest pending prescriptions to one pharmacist and
+moves them to processing. The rows are picked with SELECT ... FOR UPDATE
+SKIP LOCKED, so pharmacists claiming at the same moment get different
+prescriptions instead of queueing behind each other's locks. SQLite has
+no row locks; there the conditional UPDATE (status still pending) makes
+sure each prescription goes to only one claimer, and the loser just gets
+fewer rows.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload
+
+from admin_actions import PRESCRIPTION_STATUSES
+from models import db, Prescription
+from notifications import notify_prescription_status
+from pagination import keyset_page
+
+QUEUE_STATUSES = ('pending', 'processing')
+QUEUE_PAGE_SIZE = 50
+MAX_CLAIM = 20
+
+
+class QueueError(ValueError):
+    """A filter or claim request is invalid."""
+
+
+def parse_filters(args):
+    """Queue filters from query args: status (comma list), from/to (YYYY-MM-DD), doctor."""
+    statuses = [s for s in (args.get('status') or ','.join(QUEUE_STATUSES)).split(',') if s]
+    unknown = [s for s in statuses if s not in PRESCRIPTION_STATUSES]
+    if unknown:
+        raise QueueError(f'Unknown status {unknown[0]!r}')
+    filters = {'statuses': statuses, 'doctor': (args.get('doctor') or '').strip() or None}
+    for name in ('from', 'to'):
+        value = args.get(name)
+        try:
+            filters[name] = datetime.strptime(value, '%Y-%m-%d') if value else None
+        except ValueError:
+            raise QueueError(f'{name} must be a date (YYYY-MM-DD)')
+    return filters
+
+
+def queue_page(filters, cursor=None, limit=QUEUE_PAGE_SIZE):
+    """One page of the queue, oldest first; returns (prescriptions, next_cursor)."""
+    query = (Prescription.query.filter(Prescription.status.in_(filters['statuses']))
+             .options(selectinload(Prescription.user)))
+    if filters.get('from'):
+        query = query.filter(Prescription.uploaded_at >= filters['from'])
+    if filters.get('to'):
+        query = query.filter(Prescription.uploaded_at < filters['to'] + timedelta(days=1))
+    if filters.get('doctor'):
+        query = query.filter(Prescription.doctor_name.ilike(filters['doctor'] + '%'))
+    return keyset_page(query, [Prescription.uploaded_at, Prescription.id], cursor, limit, ascending=True)
+
+
+def claim_next(admin_id, count=1):
+    """Move the `count` oldest pending prescriptions to processing for this admin.
+
+    Commits, and returns the prescriptions actually claimed (possibly fewer).
+    """
+    if not isinstance(count, int) or not 1 <= count <= MAX_CLAIM:
+        raise QueueError(f'count must be between 1 and {MAX_CLAIM}')
+    now = datetime.utcnow()
+    ids = db.session.execute(
+        select(Prescription.id).where(Prescription.status == 'pending')
+        .order_by(Prescription.uploaded_at, Prescription.id).limit(count)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return []
+    db.session.execute(update(Prescription)
+                       .where(Prescription.id.in_(ids), Prescription.status == 'pending')
+                       .values(status='processing', claimed_by=admin_id, claimed_at=now)
+                       .execution_options(synchronize_session=False))
+    claimed = (Prescription.query.options(selectinload(Prescription.user))
+               .filter(Prescription.id.in_(ids), Prescription.claimed_by == admin_id,
+                       Prescription.claimed_at == now)
+               .order_by(Prescription.uploaded_at, Prescription.id)
+               .populate_existing().all())
+    for prescription in claimed:
+        notify_prescription_status(prescription, 'processing')
+    db.session.commit()
+    return claimed
@@ -0,0 +1,192 @@
+"""Opt-in per-request profiling and Prometheus metrics.
+
+With PROFILE_REQUESTS enabled (e.g. PHARMACY_PROFILE_REQUESTS=true),
+every request records its wall time, how many SQL statements it ran and
+how long they took, using SQLAlchemy engine events. Per-endpoint
+histograms are served by /admin/metrics in the Prometheus text format,
+together with the connection pool numbers from config.pool_metrics().
+
+A request that runs the same statement shape (SQL with literals and IN
+lists collapsed) more than PROFILE_N_PLUS_ONE times is reported as a
+likely N+1 query, and requests slower than PROFILE_SLOW_MS are logged.
+Metrics are per worker process, including how long create_app() took to
+build it.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from config import pool_metrics
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_IN_LIST_RE = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def statement_shape(statement):
+    """Statement text with literals and IN (...) lists collapsed."""
+    shape = _LITERAL_RE.sub('?', statement)
+    shape = _IN_LIST_RE.sub('(?)', shape)
+    return ' '.join(shape.split())
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+_request_seconds = Histogram('pharmacy_request_duration_seconds', 'Request wall time.',
+                             ('endpoint', 'method'), DURATION_BUCKETS)
+_db_seconds = Histogram('pharmacy_request_db_seconds', 'Time spent in SQL per request.',
+                        ('endpoint', 'method'), DURATION_BUCKETS)
+_statements = Histogram('pharmacy_request_sql_statements', 'SQL statements per request.',
+                        ('endpoint', 'method'), STATEMENT_BUCKETS)
+_POOL_METRICS = (  # pool_metrics() key, metric name, type, help
+    ('checkouts', 'pharmacy_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool.'),
+    ('timeouts', 'pharmacy_db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting.'),
+    ('wait_seconds_total', 'pharmacy_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.'),
+    ('wait_seconds_max', 'pharmacy_db_pool_wait_seconds_max', 'gauge', 'Longest wait for a connection.'),
+    ('size', 'pharmacy_db_pool_size', 'gauge', 'Configured pool size.'),
+    ('checked_out', 'pharmacy_db_pool_checked_out', 'gauge', 'Connections currently in use.'),
+    ('overflow', 'pharmacy_db_pool_overflow', 'gauge', 'Connections above pool size (negative below it).'),
+)
+_requests_total = Counter()     # (endpoint, method, status) -> count
+_n_plus_one_total = Counter()   # endpoint -> requests flagged
+
+
+def init_profiler(app, db):
+    """Install the request hooks and engine listeners if PROFILE_REQUESTS is on."""
+    app.config.setdefault('PROFILE_REQUESTS', False)
+    app.config.setdefault('PROFILE_SLOW_MS', 500)
+    app.config.setdefault('PROFILE_N_PLUS_ONE', 5)
+    if not app.config['PROFILE_REQUESTS']:
+        return
+    slow_ms = app.config['PROFILE_SLOW_MS']
+    repeat_limit = app.config['PROFILE_N_PLUS_ONE']
+
+    with app.app_context():
+        for engine in db.engines.values():
+            _listen(engine)
+
+    @app.before_request
+    def start_profile():
+        g.profile = {'start': time.perf_counter(), 'statements': 0, 'db_seconds': 0.0,
+                     'shapes': Counter()}
+
+    @app.after_request
+    def note_status(response):
+        if 'profile' in g:
+            g.profile['status'] = response.status_code
+        return response
+
+    # teardown runs for failed requests too, which after_request may not
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        status = 500 if exc is not None else profile.get('status', 500)
+        elapsed = time.perf_counter() - profile['start']
+        endpoint = request.endpoint or 'unmatched'
+        key = (endpoint, request.method)
+        repeated = [(shape, n) for shape, n in profile['shapes'].items() if n > repeat_limit]
+        with _lock:
+            _request_seconds.observe(key, elapsed)
+            _db_seconds.observe(key, profile['db_seconds'])
+            _statements.observe(key, profile['statements'])
+            _requests_total[key + (status,)] += 1
+            if repeated:
+                _n_plus_one_total[endpoint] += 1
+        for shape, n in repeated:
+            current_app.logger.warning('Possible N+1 in %s: %d x %s', endpoint, n, shape[:200])
+        if elapsed * 1000 > slow_ms:
+            current_app.logger.warning('Slow request %s %s: %.0f ms, %d statements, %.0f ms in SQL',
+                                       request.method, request.path, elapsed * 1000,
+                                       profile['statements'], profile['db_seconds'] * 1000)
+
+
+def _listen(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profile' in g:
+            context._profile_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_profile_start', None)
+        if start is None or not has_request_context():
+            return
+        profile = g.get('profile')
+        if profile is not None:
+            profile['statements'] += 1
+            profile['db_seconds'] += time.perf_counter() - start
+            profile['shapes'][statement_shape(statement)] += 1
+
+
+def render_metrics(engines, startup_seconds=None):
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = _request_seconds.render() + _db_seconds.render() + _statements.render()
+        lines += ['# HELP pharmacy_requests_total Requests served.',
+                  '# TYPE pharmacy_requests_total counter']
+        for (endpoint, method, status), count in sorted(_requests_total.items()):
+            labels = _labels(('endpoint', 'method', 'status'), (endpoint, method, status))
+            lines.append(f'pharmacy_requests_total{{{labels}}} {count}')
+        lines += ['# HELP pharmacy_n_plus_one_requests_total Requests that repeated one statement shape too often.',
+                  '# TYPE pharmacy_n_plus_one_requests_total counter']
+        for endpoint, count in sorted(_n_plus_one_total.items()):
+            lines.append(f'pharmacy_n_plus_one_requests_total{{endpoint="{_escape(endpoint)}"}} {count}')
+
+    pools = pool_metrics(engines)
+    for key, metric, kind, help_text in _POOL_METRICS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        for pool, stats in sorted(pools.items()):
+            if key in stats:
+                lines.append(f'{metric}{{pool="{_escape(pool)}"}} {stats[key]}')
+    if startup_seconds is not None:
+        lines += ['# HELP pharmacy_app_startup_seconds Time create_app() took to build this worker.',
+                  '# TYPE pharmacy_app_startup_seconds gauge',
+                  f'pharmacy_app_startup_seconds {startup_seconds}']
+    return '\n'.join(lines) + '\n'
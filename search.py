@@ -0,0 +1,403 @@
+"""In-memory product search index.
+
+An inverted index from word to product ids over name, category and
+description, plus a sorted vocabulary so a partial last word ("parac")
+can be expanded with a binary search. Results are ranked by which field
+matched. The index is built once from the database and kept current by
+the admin product endpoints; a TTL rebuild picks up writes made by other
+worker processes.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from models import Product
+
+SEARCH_INDEX_TTL = 600  # seconds
+SEARCH_RESULT_LIMIT = 10
+# most candidates a multi-word query scores one by one
+SCORE_BUDGET = 2000
+# a query word expanding to more indexed words than this ("c", "1") is a broad prefix
+BROAD_PREFIX_WORDS = 50
+
+# a hit in the name ranks above one in the category, above one in the description
+FIELD_WEIGHTS = {'name': 3, 'category': 2, 'description': 1}
+EXACT_BONUS = 1
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(value):
+    return _TOKEN_RE.findall((value or '').lower())
+
+
+def _weigh(name, category, description):
+    """{word: weight of the best field it appears in} for one product."""
+    words = {}
+    for field, value in (('name', name), ('category', category), ('description', description)):
+        weight = FIELD_WEIGHTS[field]
+        for word in tokenize(value):
+            if words.get(word, 0) < weight:
+                words[word] = weight
+    return words
+
+
+def _name_text(name):
+    return ' ' + ' '.join(tokenize(name))
+
+
+def _term_score(words, term):
+    """Score of one query term against a product's {word: weight}, as _score() counts it."""
+    return max((weight + (EXACT_BONUS if word == term else 0)
+                for word, weight in words.items() if word.startswith(term)), default=0)
+
+
+class SearchIndex:
+    """Word -> {product_id: weight} postings with prefix expansion.
+
+    Each word also keeps its postings per weight as lists sorted by product
+    name, so a single-word typeahead query can take the best `limit` hits
+    tier by tier without scoring every product that contains the word.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = {}    # word -> {weight: set of product ids}
+        self.ranked = {}      # word -> {weight: sorted [(name, product_id)]}
+        self.vocabulary = []  # sorted list of indexed words
+        self.doc_words = {}   # product_id -> {word: weight}
+        self.names = {}       # product_id -> lowercased name, for tie-breaking
+        self.name_text = {}   # product_id -> ' word word' of the name, for broad prefix checks
+
+    def __len__(self):
+        return len(self.doc_words)
+
+    @classmethod
+    def build(cls, rows):
+        """Bulk-build from (id, name, category, description) rows, sorting once."""
+        index = cls()
+        for product_id, name, category, description in rows:
+            words = _weigh(name, category, description)
+            key = (name or '').lower()
+            index.doc_words[product_id] = words
+            index.names[product_id] = key
+            index.name_text[product_id] = _name_text(name)
+            for word, weight in words.items():
+                index.postings.setdefault(word, {}).setdefault(weight, set()).add(product_id)
+                index.ranked.setdefault(word, {}).setdefault(weight, []).append((key, product_id))
+        for tiers in index.ranked.values():
+            for tier in tiers.values():
+                tier.sort()
+        index.vocabulary = sorted(index.postings)
+        return index
+
+    def add(self, product_id, name, category=None, description=None):
+        """Index (or re-index) one product."""
+        words = _weigh(name, category, description)
+        key = (name or '').lower()
+        with self._lock:
+            self._remove(product_id)
+            self.doc_words[product_id] = words
+            self.names[product_id] = key
+            self.name_text[product_id] = _name_text(name)
+            for word, weight in words.items():
+                levels = self.postings.get(word)
+                if levels is None:
+                    levels = self.postings[word] = {}
+                    self.ranked[word] = {}
+                    bisect.insort(self.vocabulary, word)
+                levels.setdefault(weight, set()).add(product_id)
+                bisect.insort(self.ranked[word].setdefault(weight, []), (key, product_id))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id):
+        words = self.doc_words.pop(product_id, None)
+        key = self.names.pop(product_id, None)
+        self.name_text.pop(product_id, None)
+        if not words:
+            return
+        for word, weight in words.items():
+            levels = self.postings.get(word)
+            if levels is None:
+                continue
+            levels.get(weight, set()).discard(product_id)
+            if not levels.get(weight, True):
+                del levels[weight]
+            tier = self.ranked[word].get(weight, [])
+            i = bisect.bisect_left(tier, (key, product_id))
+            if i < len(tier) and tier[i] == (key, product_id):
+                del tier[i]
+            if not levels:
+                del self.postings[word]
+                del self.ranked[word]
+                i = bisect.bisect_left(self.vocabulary, word)
+                if i < len(self.vocabulary) and self.vocabulary[i] == word:
+                    del self.vocabulary[i]
+
+    def _expand(self, term):
+        """All indexed words starting with term, via the sorted vocabulary."""
+        i = bisect.bisect_left(self.vocabulary, term)
+        # words with the prefix end before the prefix with its last letter bumped
+        j = bisect.bisect_left(self.vocabulary, term[:-1] + chr(ord(term[-1]) + 1), i)
+        return self.vocabulary[i:j]
+
+    def _search_one(self, term, words, limit):
+        """Single-term search: walk score tiers best-first, each in name order."""
+        top = max(FIELD_WEIGHTS.values()) + EXACT_BONUS
+        seen = set()
+        results = []
+        for score in range(top, 0, -1):
+            tiers = []
+            for word in words:
+                weight = score - (EXACT_BONUS if word == term else 0)
+                tier = self.ranked[word].get(weight)
+                if tier:
+                    tiers.append(tier)
+            # a product's first (highest) tier is its score; later hits are dupes
+            for _, product_id in heapq.merge(*tiers):
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                results.append(product_id)
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
+
+    def _matching(self, terms, expansions, weight=None):
+        """Ids matching every term; only hits of the given field weight if set.
+
+        Starts from the rarest term. A broad prefix met once few candidates
+        are left is checked against their own words instead of collecting
+        the postings of everything it expands to.
+        """
+        result = None
+        for term, words in self._rarest_first(terms, expansions):
+            if result is not None and len(words) > BROAD_PREFIX_WORDS and self._few(result, words):
+                result = {pid for pid in result if any(
+                    word.startswith(term) and (weight is None or w == weight)
+                    for word, w in self.doc_words[pid].items())}
+            else:
+                levels = [self.postings[w] for w in words]
+                if weight is None:
+                    sets = [ids for lv in levels for ids in lv.values()]
+                else:
+                    sets = [lv[weight] for lv in levels if weight in lv]
+                ids = set().union(*sets)
+                result = ids if result is None else result & ids
+            if not result:
+                break
+        return result
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Ranked product ids matching every word of query as a prefix.
+
+        Products are ordered by field score, then by name. limit=None
+        returns every match. Broad multi-word queries (more than
+        SCORE_BUDGET possible hits per word, or a word that is a short
+        prefix of many indexed words) only rank products with every word
+        in the name, as long as that still fills the limit.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            expansions = [self._expand(term) for term in terms]
+            if not all(expansions):
+                return []
+            if len(terms) == 1:
+                return self._search_one(terms[0], expansions[0], limit)
+            if limit is not None and any(len(words) > BROAD_PREFIX_WORDS for words in expansions):
+                # a short prefix ("vit c"): rank name matches without expanding it
+                found = self._search_names(terms, expansions, limit)
+                if found is not None:
+                    return found
+
+            if limit is not None and min(self._size(words, SCORE_BUDGET) for words in expansions) > SCORE_BUDGET:
+                # very broad query: rank only products with every word in the name
+                candidates = self._matching(terms, expansions, FIELD_WEIGHTS['name'])
+                if len(candidates) < limit:
+                    candidates = self._matching(terms, expansions)
+            else:
+                candidates = self._matching(terms, expansions)
+            scores = self._score(terms, expansions, candidates)
+            scored = [(-score, self.names[pid], pid) for pid, score in scores.items()]
+
+        if limit is None:
+            scored.sort()
+        else:
+            scored = heapq.nsmallest(limit, scored)
+        return [product_id for _, _, product_id in scored]
+
+    def _search_names(self, terms, expansions, limit):
+        """Best `limit` products with every term in the name; None if there are fewer.
+
+        Narrow terms are intersected as sets, rarest first; broad prefixes
+        are checked against each candidate's name instead of being
+        expanded. A small candidate set is scored whole. Otherwise the
+        rarest term is walked in name order until `limit` products are sure
+        to beat everything not seen yet, or SCORE_BUDGET candidates were
+        checked (then hits past the sure ones may be slightly out of order).
+        """
+        name = FIELD_WEIGHTS['name']
+        narrow = sorted((words for words in expansions if len(words) <= BROAD_PREFIX_WORDS), key=self._size)
+        # ' c' in ' vitamin c 500' means some word of the name starts with 'c'
+        broad = [' ' + term for term, words in zip(terms, expansions) if len(words) > BROAD_PREFIX_WORDS]
+        allowed = None
+        for words in narrow:
+            ids = set().union(*[self.postings[w].get(name, ()) for w in words])
+            allowed = ids if allowed is None else allowed & ids
+            if not allowed:
+                return None
+
+        def score(product_id):
+            text = self.name_text[product_id]
+            for prefix in broad:
+                if prefix not in text:
+                    return None
+            words = self.doc_words[product_id]
+            return sum(_term_score(words, term) for term in terms)
+
+        found = {}
+        if allowed is not None and len(allowed) <= SCORE_BUDGET:
+            for product_id in allowed:
+                total = score(product_id)
+                if total is not None:
+                    found[product_id] = total
+        else:
+            # only these can carry a term's exact-word bonus; small sets are checked up front
+            seeds = {}
+            for term in terms:
+                ids = self.postings.get(term, {}).get(name)
+                if ids:
+                    seeds[term] = ids if len(ids) <= SCORE_BUDGET else None
+            unseen_best = sum(name + (EXACT_BONUS if term in seeds and seeds[term] is None else 0)
+                              for term in terms)
+            sure = 0
+            for ids in seeds.values():
+                for product_id in ids or ():
+                    if product_id in found or (allowed is not None and product_id not in allowed):
+                        continue
+                    total = score(product_id)
+                    if total is not None:
+                        found[product_id] = total
+                        sure += total > unseen_best
+            lead = narrow[0] if narrow else min(expansions, key=len)
+            tiers = [self.ranked[w][name] for w in lead if name in self.ranked[w]]
+            checked = 0
+            for _, product_id in heapq.merge(*tiers):
+                if sure >= limit or checked >= SCORE_BUDGET:
+                    break
+                if product_id in found or (allowed is not None and product_id not in allowed):
+                    continue
+                checked += 1
+                total = score(product_id)
+                if total is not None:
+                    found[product_id] = total
+                    # anything later in name order scores at most unseen_best, so ranks below
+                    sure += total >= unseen_best
+        if len(found) < limit:
+            return None
+        return [product_id for _, _, product_id in
+                heapq.nsmallest(limit, [(-total, self.names[pid], pid) for pid, total in found.items()])]
+
+    def _size(self, words, cap=None):
+        """Number of postings behind a term's expansion (upper bound on hits), counted up to cap."""
+        total = 0
+        for w in words:
+            total += sum(map(len, self.postings[w].values()))
+            if cap is not None and total > cap:
+                break
+        return total
+
+    def _few(self, candidates, words):
+        """True if checking each candidate's words beats going through the postings of words."""
+        # a Python-level check per candidate costs about as much as 25 postings in set operations
+        return len(candidates) * 25 < self._size(words, len(candidates) * 25)
+
+    def _rarest_first(self, terms, expansions):
+        """(term, words) pairs, fewest postings first; broad prefixes last, without counting them."""
+        def key(pair):
+            broad = len(pair[1]) > BROAD_PREFIX_WORDS
+            return broad, 0 if broad else self._size(pair[1])
+        return sorted(zip(terms, expansions), key=key)
+
+    def _score(self, terms, expansions, candidates):
+        """{product_id: total score} for candidates.
+
+        Each term is scored best level first, so every candidate is touched
+        by Python code once per term; the rest is C-level set algebra.
+        """
+        scores = dict.fromkeys(candidates, 0)
+        top = max(FIELD_WEIGHTS.values()) + EXACT_BONUS
+        for term, words in zip(terms, expansions):
+            if len(words) > BROAD_PREFIX_WORDS and self._few(candidates, words):
+                # a broad prefix over few candidates: cheaper to look at their own words
+                for product_id in candidates:
+                    scores[product_id] += _term_score(self.doc_words[product_id], term)
+                continue
+            remaining = set(candidates)
+            for score in range(top, 0, -1):
+                if not remaining:
+                    break
+                hits = set()
+                for word in words:
+                    ids = self.postings[word].get(score - (EXACT_BONUS if word == term else 0))
+                    if ids:
+                        hits |= ids & remaining
+                for product_id in hits:
+                    scores[product_id] += score
+                remaining -= hits
+        return scores
+
+
+_index = SearchIndex()
+_state = {'built_at': None}
+_build_lock = threading.Lock()
+
+
+def _ensure_built():
+    now = time.monotonic()
+    built_at = _state['built_at']
+    if built_at is not None and now - built_at < SEARCH_INDEX_TTL:
+        return
+    with _build_lock:
+        if _state['built_at'] is not None and now - _state['built_at'] < SEARCH_INDEX_TTL:
+            return
+        rebuild_search_index()
+
+
+def rebuild_search_index():
+    """Index every active product from scratch."""
+    global _index
+    rows = Product.query.with_entities(
+        Product.id, Product.name, Product.category, Product.description
+    ).filter(Product.is_active.is_(True))
+    _index = SearchIndex.build(rows)
+    _state['built_at'] = time.monotonic()
+
+
+def search_products(query, limit=SEARCH_RESULT_LIMIT):
+    """Ranked ids of active products matching query (prefix-aware)."""
+    _ensure_built()
+    return _index.search(query, limit)
+
+
+def index_product(product):
+    """Reflect an admin create/update of a product in the index."""
+    if _state['built_at'] is None:
+        return  # nothing built yet; the first search loads everything
+    if product.is_active:
+        _index.add(product.id, product.name, product.category, product.description)
+    else:
+        _index.remove(product.id)
+
+
+def unindex_product(product_id):
+    """Reflect an admin delete of a product in the index."""
+    if _state['built_at'] is not None:
+        _index.remove(product_id)
@@ -0,0 +1,153 @@
+"""Customer pages: login, catalog, prescriptions, cart and order history."""
+from flask import Blueprint, render_template, request, session, flash, redirect, url_for
+from sqlalchemy.orm import selectinload
+
+from auth import authenticate, login_required, login_retry_after, MAX_PASSWORD_LENGTH
+from catalog import get_catalog_products
+from config import read_replica
+from models import db, Order, OrderArchive, Prescription, PrescriptionArchive, User
+from pagination import keyset_page
+
+bp = Blueprint('shop', __name__)
+
+ORDERS_PAGE_SIZE = 20
+
+
+@bp.route('/', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        next_url = request.form.get('next') or request.args.get('next')
+
+        if not (username and password):
+            flash('Username and password are required.', 'error')
+            return render_template('login.html', next=next_url)
+        if len(password) > MAX_PASSWORD_LENGTH:
+            flash(f'Passwords can be at most {MAX_PASSWORD_LENGTH} characters.', 'error')
+            return render_template('login.html', next=next_url)
+
+        # checked before any lookup or hashing, so bursts of attempts stay cheap
+        retry_after = login_retry_after(username)
+        if retry_after:
+            flash(f'Too many login attempts. Please try again in {int(retry_after) + 1} seconds.', 'error')
+            return render_template('login.html', next=next_url), 429
+
+        # Find existing user by username
+        try:
+            user = User.query.filter_by(username=username).first()
+            
+            if user:
+                # existing user: verify password (re-hashed if the hash settings changed)
+                if not authenticate(user, password):
+                    flash('Invalid password. Please try again.', 'error')
+                    return render_template('login.html', next=next_url)
+                db.session.commit()
+            else:
+                # create new user with provided username; use username as name by default
+                try:
+                    user = User(username=username, name=username)
+                    user.set_password(password)
+                    db.session.add(user)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    if 'Duplicate entry' in str(e):
+                        flash('Username already taken. Please choose a different username.', 'error')
+                    else:
+                        flash('An error occurred while creating your account. Please try again.', 'error')
+                    return render_template('login.html', next=next_url)
+
+            # Set session
+            session['user_id'] = user.id
+            session['user_name'] = user.name
+            flash('Successfully logged in!', 'success')
+
+            if next_url:
+                return redirect(next_url)
+            return redirect(url_for('.home'))
+
+        except Exception as e:
+            flash('An error occurred. Please try again.', 'error')
+            return render_template('login.html', next=next_url)
+
+    return render_template('login.html')
+
+
+@bp.route('/logout')
+def logout():
+    session.pop('user_id', None)
+    session.pop('user_name', None)
+    return redirect(url_for('.login'))
+
+@bp.route('/home')
+def home():
+    # If user is not logged in, send them to the login page first
+    if not session.get('user_id'):
+        return redirect(url_for('.login'))
+    return render_template('index.html')
+
+@bp.route('/products')
+@login_required
+def products():
+    return render_template('products.html', products=get_catalog_products())
+
+
+@bp.route('/services')
+@login_required
+def services():
+    return render_template('services.html')
+
+
+@bp.route('/prescriptions')
+@login_required
+@read_replica
+def prescriptions():
+    archived = bool(request.args.get('archived'))
+    user_prescriptions = prescription_history(session['user_id'], archived)
+    return render_template('prescriptions.html', prescriptions=user_prescriptions, archived=archived)
+
+
+def prescription_history(user_id, archived=False):
+    """A user's prescriptions, newest first; archived=True reads prescription_archives instead."""
+    model = PrescriptionArchive if archived else Prescription
+    return model.query.filter(model.user_id == user_id).order_by(model.uploaded_at.desc()).all()
+
+
+@bp.route('/cart')
+@login_required
+def cart():
+    return render_template('cart.html')
+
+
+@bp.route('/orders')
+@login_required
+@read_replica
+def orders():
+    archived = bool(request.args.get('archived'))
+    try:
+        user_orders, next_cursor = order_history_page(session['user_id'], request.args.get('cursor'), archived)
+    except ValueError:
+        flash('Invalid page link', 'error')
+        return redirect(url_for('.orders'))
+    return render_template('orders.html', orders=user_orders, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'), archived=archived)
+
+
+def order_history_page(user_id, cursor, archived=False):
+    """One page of a user's orders, newest first, with items and address batch-loaded.
+
+    Walks ix_orders_user_created_at_id (or its twin on order_archives when
+    archived), so every page costs the same three queries however many
+    orders the customer has.
+    """
+    model = OrderArchive if archived else Order
+    query = (model.query.filter(model.user_id == user_id)
+             .options(selectinload(model.items), selectinload(model.address)))
+    return keyset_page(query, [model.created_at, model.id], cursor, ORDERS_PAGE_SIZE)
+
+
+@bp.route('/delivery')
+
+def delivery():
+    return render_template('delivery.html')
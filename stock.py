@@ -0,0 +1,67 @@
+"""Stock reservation used by checkout.
+
+Stock is decremented with a single conditional UPDATE for the whole cart
+instead of read-modify-write on the ORM objects, so two concurrent
+checkouts can never sell the same unit twice.
+"""
+from sqlalchemy import case, select, update
+
+from models import db, Product
+
+
+class InsufficientStock(Exception):
+    """Raised when a cart asks for more units than a product has left."""
+
+    def __init__(self, product_id, name, available, message=None):
+        super().__init__(message or f'Insufficient stock for {name}. Only {available} left.')
+        self.product_id = product_id
+        self.name = name
+        self.available = available
+
+
+def reserve_stock(quantities):
+    """Decrement stock for a {product_id: qty} mapping in one statement.
+
+    Every row is updated only if it still has enough stock, so the update
+    either matches all products or the cart is rejected. Row locks are
+    taken by the primary key scan in id order, which keeps concurrent
+    checkouts from deadlocking. Products that reach zero are deactivated.
+
+    Raises InsufficientStock after rolling back the session, so nothing the
+    caller staged for this order is left behind.
+    """
+    if not quantities:
+        return
+    products = Product.__table__
+    ids = sorted(quantities)
+    wanted = case(quantities, value=products.c.id)
+
+    result = db.session.execute(
+        update(products)
+        .where(products.c.id.in_(ids), products.c.stock >= wanted)
+        .values(stock=products.c.stock - wanted)
+    )
+    if result.rowcount != len(ids):
+        # undo the rows that did match, then report the first short product
+        db.session.rollback()
+        rows = db.session.execute(
+            select(products.c.id, products.c.name, products.c.stock)
+            .where(products.c.id.in_(ids))
+        )
+        current = {row.id: row for row in rows}
+        for product_id in ids:
+            row = current.get(product_id)
+            if row is None:
+                raise InsufficientStock(product_id, f'product #{product_id}', 0)
+            if row.stock < quantities[product_id]:
+                raise InsufficientStock(product_id, row.name, row.stock)
+        # restocked concurrently right after our update missed it
+        raise InsufficientStock(None, 'an item in your cart', 0,
+                                'Stock changed while placing your order. Please try again.')
+
+    # set is_active to 0 for anything this order sold out
+    db.session.execute(
+        update(products)
+        .where(products.c.id.in_(ids), products.c.stock == 0)
+        .values(is_active=False)
+    )
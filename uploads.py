@@ -0,0 +1,171 @@
+"""Streaming prescription uploads and their background post-processing.
+
+Multipart file parts are written straight into the upload folder as the
+request body arrives, hashed on the fly and cut off as soon as they pass
+the size limit, so a request worker never buffers a whole scan in memory
+or copies it a second time (blobstore.py hard-links it into place).
+Everything slow (checksum verification, normalising and downscaling
+images, thumbnails) runs afterwards on a small thread pool;
+Prescription.status moves from 'received' to 'pending' (or 'failed')
+when it is done. The blob itself always keeps the uploaded bytes, so its
+name stays their SHA-256; normalised copies and thumbnails are derived
+files next to it (normalised_path(), thumbnail_path()).
+"""
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from models import db, Prescription
+
+try:  # image normalisation is optional; PDFs and plain uploads work without it
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depends on the deployment
+    Image = None
+
+MAX_PRESCRIPTION_BYTES = 15 * 1024 * 1024
+MAX_IMAGE_SIDE = 2000
+THUMBNAIL_SIZE = (256, 256)
+UPLOAD_WORKERS = 2
+CHUNK_SIZE = 64 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UploadStream:
+    """Writable file that lands on disk under `directory` while hashing.
+
+    Exceeding `max_bytes` aborts the request with 413 right away. The
+    file is removed when the request closes, so callers link or copy it
+    somewhere permanent first (see blobstore.store_blob).
+    """
+
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'.incoming-{uuid.uuid4().hex}')
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f'File is larger than {self.max_bytes // (1024 * 1024)} MB')
+        self._hash.update(chunk)
+        return self._file.write(chunk)
+
+    def finish(self):
+        """Flush and close the file; it stays on disk until the request closes."""
+        self._file.close()
+
+    # werkzeug treats the stream as a regular file (seek/read for FileStorage)
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StreamingUploadRequest(Request):
+    """Request class whose file parts are written by UploadStream."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_bytes = current_app.config.get('MAX_PRESCRIPTION_BYTES', MAX_PRESCRIPTION_BYTES)
+        if content_length is not None and content_length > max_bytes:
+            raise RequestEntityTooLarge()
+        return UploadStream(current_app.config['UPLOAD_FOLDER'], max_bytes)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _normalise_image(path, normalised_path, thumbnail_path):
+    """Write an EXIF-rotated copy with a capped long side (if needed) and a thumbnail."""
+    with Image.open(path) as original:
+        fmt = original.format
+        rotated = original.getexif().get(0x0112, 1) != 1  # EXIF orientation tag
+        img = ImageOps.exif_transpose(original)
+    if rotated or max(img.size) > MAX_IMAGE_SIDE:
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        os.makedirs(os.path.dirname(normalised_path), exist_ok=True)
+        if fmt == 'JPEG':
+            img.convert('RGB').save(normalised_path, 'JPEG', quality=85, optimize=True)
+        else:
+            img.save(normalised_path, fmt)
+    thumb = img.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE)
+    os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+    thumb.convert('RGB').save(thumbnail_path, 'JPEG', quality=80)
+
+
+def normalised_path(upload_folder, filename):
+    return os.path.join(upload_folder, 'normalised', filename)
+
+
+def thumbnail_path(upload_folder, filename):
+    return os.path.join(upload_folder, 'thumbs', f'{filename}.jpg')
+
+
+def process_prescription_upload(app, prescription_id, path, expected_sha256):
+    """Background step for one upload; runs on the worker pool."""
+    with app.app_context():
+        status = 'pending'
+        try:
+            if _file_sha256(path) != expected_sha256:
+                raise ValueError('checksum mismatch')
+            if Image is not None and path.rsplit('.', 1)[-1].lower() in ('png', 'jpg', 'jpeg'):
+                name = os.path.basename(path)
+                _normalise_image(path, normalised_path(app.config['UPLOAD_FOLDER'], name),
+                                 thumbnail_path(app.config['UPLOAD_FOLDER'], name))
+        except Exception as e:
+            print('Prescription post-processing failed:', prescription_id, str(e))
+            status = 'failed'
+        try:
+            prescription = db.session.get(Prescription, prescription_id)
+            if prescription is not None and prescription.status == 'received':
+                prescription.status = status
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print('Could not update prescription status:', prescription_id, str(e))
+        finally:
+            db.session.remove()
+
+
+def submit_post_processing(prescription_id, path, expected_sha256):
+    """Queue post-processing for a committed upload and return immediately."""
+    global _executor
+    app = current_app._get_current_object()
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('UPLOAD_WORKERS', UPLOAD_WORKERS),
+                                           thread_name_prefix='upload')
+    return _executor.submit(process_prescription_upload, app, prescription_id, path, expected_sha256)